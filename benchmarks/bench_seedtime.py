@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+#
+# bench_seedtime.py
+#
+# Benchmarks the SeedTime core plugin against a simulated torrent session.
+#
+# usage: python benchmarks/bench_seedtime.py [--sizes 1000,10000,100000]
+#                                            [--output results.json]
+#                                            [--compare previous.json]
+#
+# Results are written as JSON so runs from different commits can be compared
+# with --compare. Needs twisted, deluge itself is replaced by benchmarks/fakes.py.
+#
+
+import gc
+import json
+import logging
+import optparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+SEEDTIME_DIR = os.path.join(os.path.dirname(BENCH_DIR), "seedtime")
+sys.path.insert(0, SEEDTIME_DIR)
+
+from fakes import FakeDeluge
+
+TRACKER_HOSTS = 20
+LABELS = ["tv", "movies", "music", "books", "games", "linux", "software", "anime", "misc", "private"]
+FILTER_RULES = 200
+EXPIRED_FRACTION = 0.01
+MISSED_FRACTION = 0.05
+SAMPLE_SIZE = 10000
+
+
+def build_filter_list(rng):
+    """Mostly non-matching rules ahead of the ones that match, the expensive case."""
+    filter_list = []
+    for i in range(FILTER_RULES - TRACKER_HOSTS - len(LABELS)):
+        if i % 2:
+            filter_list.append({"field": "tracker", "filter": "unused%d.example.net" % i, "stop_time": 1.0})
+        else:
+            filter_list.append({"field": "tracker", "filter": r"unused%d\.example\.(net|com)" % i, "stop_time": 1.0})
+    for label in LABELS:
+        filter_list.append({"field": "label", "filter": "^%s$" % label, "stop_time": rng.choice([3.0, 7.0])})
+    for host in range(TRACKER_HOSTS):
+        filter_list.append({"field": "tracker", "filter": r"tracker%d\.example\.org" % host, "stop_time": 14.0})
+    return filter_list
+
+
+def build_fleet(deluge, size, rng):
+    # private trackers put a per-user passkey in the url, so it is shared by all torrents of a tracker
+    tracker_urls = ["http://tracker%d.example.org:2710/%032x/announce" % (host, rng.getrandbits(128))
+                    for host in range(TRACKER_HOSTS)]
+    for i in range(size):
+        roll = rng.random()
+        if roll < 0.7:
+            state = "Seeding"
+        elif roll < 0.9:
+            state = "Paused"
+        else:
+            state = "Downloading"
+        trackers = [tracker_urls[rng.randrange(TRACKER_HOSTS)] for _ in range(rng.randint(1, 3))]
+        deluge.torrent_manager.add("%040x" % rng.getrandbits(160), state, rng.randrange(0, 10 * 86400),
+                                   trackers, rng.choice(LABELS + [""]))
+
+
+def timed(func, *args):
+    gc.collect()
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+
+def run_size(size, seed):
+    rng = random.Random(seed)
+    config_dir = tempfile.mkdtemp(prefix="seedtime-bench-")
+    try:
+        deluge = FakeDeluge(config_dir)
+        deluge.install()
+        # reload every plugin module against the new fakes
+        plugin_modules = set(os.path.splitext(name)[0] for name in os.listdir(SEEDTIME_DIR)
+                             if name.endswith(".py"))
+        for name in list(sys.modules):
+            if name in plugin_modules:
+                del sys.modules[name]
+        import core
+
+        plugin = core.Core("SeedTime")
+        plugin.enable()
+        plugin.set_config({"filter_list": build_filter_list(rng), "max_actions_per_second": 0,
+                           "worker_threads": 0})
+        build_fleet(deluge, size, rng)
+        tm = deluge.torrent_manager
+        torrent_ids = list(tm.torrents)
+        sample = torrent_ids[:SAMPLE_SIZE]
+        results = {"torrents": size}
+
+        # filter throughput
+        tm.status_calls = 0
+        elapsed, _ = timed(lambda: [plugin.apply_filter(torrent_id) for torrent_id in sample])
+        results["apply_filter"] = {
+            "seconds": elapsed,
+            "torrents_per_second": len(sample) / elapsed,
+            "status_calls": tm.status_calls,
+        }
+
+        # give every torrent a stop time, a small fraction of them already expired
+        stop_times = {}
+        for torrent_id in torrent_ids:
+            torrent = tm.torrents[torrent_id]
+            if rng.random() < EXPIRED_FRACTION:
+                stop_times[torrent_id] = torrent.seeding_time / 86400.0 * 0.5
+            else:
+                stop_times[torrent_id] = 30.0
+        elapsed, _ = timed(lambda: [plugin.set_torrent(torrent_id, stop) for torrent_id, stop in stop_times.iteritems()])
+        results["set_torrent"] = {"seconds": elapsed, "per_call_us": elapsed / size * 1e6}
+
+        elapsed, _ = timed(plugin.saver.flush)
+        results["save"] = {"seconds": elapsed, "bytes": os.path.getsize(plugin.torrent_stop_times.filename)}
+
+        # one reconciliation pass with nothing changed, then the deadline tick
+        tm.reset_counters()
+        elapsed, _ = timed(plugin.update_checker)
+        results["scan_tick"] = dict(tm.get_counters(), seconds=elapsed)
+
+        tm.reset_counters()
+        elapsed, _ = timed(plugin.check_deadlines)
+        expired = len(plugin.enforcer)
+        results["deadline_tick"] = dict(tm.get_counters(), seconds=elapsed, expired=expired)
+
+        # a pass that finds torrents which resumed seeding without a state change event
+        missed = [torrent for torrent in tm.torrents.itervalues()
+                  if torrent.state == "Seeding" and rng.random() < MISSED_FRACTION]
+        for torrent in missed:
+            torrent.state = "Paused"
+        plugin.update_checker()
+        for torrent in missed:
+            torrent.state = "Seeding"
+        tm.reset_counters()
+        elapsed, _ = timed(plugin.update_checker)
+        results["missed_tick"] = dict(tm.get_counters(), seconds=elapsed, missed=len(missed))
+
+        def drain():
+            while len(plugin.enforcer):
+                plugin.enforcer.run()
+        elapsed, _ = timed(drain)
+        results["enforce"] = {"seconds": elapsed, "actions": expired}
+
+        # status fields as requested by a torrent list refresh
+        tm.reset_counters()
+        stop_field = deluge.plugin_manager.status_fields["seed_stop_time"]
+        remaining_field = deluge.plugin_manager.status_fields["seed_time_remaining"]
+        elapsed, _ = timed(lambda: [(stop_field(torrent_id), remaining_field(torrent_id))
+                                    for torrent_id in tm.torrents])
+        results["status_fields"] = dict(tm.get_counters(), seconds=elapsed,
+                                        per_torrent_us=elapsed / len(tm.torrents) * 1e6)
+
+        # the reconcile loop never ran here, write the snapshot its timer would have
+        elapsed, _ = timed(plugin.write_snapshot)
+        results["snapshot_write"] = {"seconds": elapsed, "bytes": plugin.snapshot_size}
+        plugin.disable()
+
+        # a daemon restart: enable against the stop times and snapshot persisted
+        # above before the torrents are loaded, then the first reconcile pass
+        tm.session_started = False
+        restarted = core.Core("SeedTime")
+        elapsed, _ = timed(restarted.enable)
+        results["enable"] = {"seconds": elapsed}
+        tm.session_started = True
+        tm.reset_counters()
+        elapsed, _ = timed(restarted.start_looping)
+        results["warm_start"] = dict(tm.get_counters(), seconds=elapsed, scheduled=len(restarted.scheduler))
+        restarted.disable()
+        return results
+    finally:
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    for size, metrics in sorted(current["results"].items(), key=lambda item: int(item[0])):
+        old_metrics = previous["results"].get(size)
+        if old_metrics is None:
+            continue
+        print "%s torrents (%s -> %s)" % (size, previous.get("revision"), current.get("revision"))
+        for name, values in sorted(metrics.items()):
+            if not isinstance(values, dict) or name not in old_metrics:
+                continue
+            old, new = old_metrics[name]["seconds"], values["seconds"]
+            print "  %-16s %10.4fs %10.4fs  x%.2f" % (name, old, new, old / new if new else 0)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--sizes", default="1000,10000,100000")
+    parser.add_option("--seed", type="int", default=1)
+    parser.add_option("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_option("--compare", help="JSON results of a previous run to compare against")
+    options, args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    current = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "results": {},
+    }
+    for size in options.sizes.split(","):
+        current["results"][size] = run_size(int(size), options.seed)
+
+    output = json.dumps(current, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write(output)
+    else:
+        print output
+
+    if options.compare:
+        with open(options.compare) as f:
+            compare(json.load(f), current)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#
+# fakes.py
+#
+# In-memory stand-ins for the parts of deluge the SeedTime core plugin uses,
+# so the plugin can be driven without a running daemon or libtorrent.
+#
+
+import json
+import logging
+import os
+import sys
+import types
+
+
+class DelugeEvent(object):
+    """Same interface as deluge.event.DelugeEvent."""
+
+    @property
+    def name(self):
+        return self.__class__.__name__
+
+    @property
+    def args(self):
+        return getattr(self, "_args", [])
+
+
+def make_event(name, *args):
+    event = type(name, (DelugeEvent,), {})()
+    event._args = list(args)
+    return event
+
+
+class FakeTorrentStatus(object):
+    """The fields of libtorrent's torrent_status the plugin reads."""
+
+    def __init__(self, torrent):
+        self.handle = torrent.handle
+        self.seeding_time = torrent.seeding_time
+        self.all_time_upload = torrent.all_time_upload
+        self.total_done = torrent.total_done
+
+
+class FakeTorrentHandle(object):
+    def __init__(self, torrent):
+        self.torrent = torrent
+
+    def info_hash(self):
+        return self.torrent.torrent_id
+
+    def status(self):
+        self.torrent.manager.handle_status_calls += 1
+        return FakeTorrentStatus(self.torrent)
+
+
+class FakeTorrent(object):
+    def __init__(self, manager, torrent_id, state, seeding_time, trackers, label):
+        self.manager = manager
+        self.torrent_id = torrent_id
+        self.state = state
+        self.seeding_time = seeding_time
+        self.trackers = trackers
+        self.label = label
+        self.all_time_upload = 0
+        self.total_done = 1 << 30
+        self.handle = FakeTorrentHandle(self)
+
+    @property
+    def ratio(self):
+        return float(self.all_time_upload) / self.total_done
+
+    @property
+    def total_uploaded(self):
+        return self.all_time_upload
+
+    def get_status(self, keys):
+        self.manager.status_calls += 1
+        status = {}
+        for key in keys:
+            if key == "trackers":
+                status[key] = [{"url": url, "tier": 0} for url in self.trackers]
+            else:
+                status[key] = getattr(self, key)
+        return status
+
+    def pause(self):
+        self.set_state("Paused")
+
+    def resume(self):
+        self.set_state("Seeding")
+
+    def set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.manager.event_manager.emit(make_event("TorrentStateChangedEvent", self.torrent_id, state))
+
+
+class FakeTorrentManager(object):
+    def __init__(self, event_manager):
+        self.event_manager = event_manager
+        self.torrents = {}
+        self.session_started = True
+        self.status_calls = 0
+        self.status_batches = 0
+        self.handle_status_calls = 0
+        self.removed = 0
+
+    def __getitem__(self, torrent_id):
+        return self.torrents[torrent_id]
+
+    def reset_counters(self):
+        self.status_calls = 0
+        self.status_batches = 0
+        self.handle_status_calls = 0
+
+    def get_counters(self):
+        # every status call builds a status dict, the main per torrent allocation
+        return {"status_calls": self.status_calls, "status_batches": self.status_batches,
+                "handle_status_calls": self.handle_status_calls}
+
+    def add(self, torrent_id, state="Seeding", seeding_time=0, trackers=(), label=""):
+        torrent = FakeTorrent(self, torrent_id, state, seeding_time, list(trackers), label)
+        self.torrents[torrent_id] = torrent
+        self.event_manager.emit(make_event("TorrentAddedEvent", torrent_id, False))
+        return torrent
+
+    def remove(self, torrent_id, remove_data=False):
+        del self.torrents[torrent_id]
+        self.removed += 1
+        self.event_manager.emit(make_event("TorrentRemovedEvent", torrent_id))
+        return True
+
+
+class FakeEventManager(object):
+    def __init__(self):
+        self.handlers = {}
+        self.emitted = []
+
+    def register_event_handler(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def deregister_event_handler(self, event, handler):
+        if handler in self.handlers.get(event, []):
+            self.handlers[event].remove(handler)
+
+    def emit(self, event):
+        self.emitted.append(event)
+        for handler in list(self.handlers.get(event.name, [])):
+            handler(*event.args)
+
+
+class FakeCorePluginManager(object):
+    def __init__(self):
+        self.status_fields = {}
+        self.enabled_plugins = ["Label", "SeedTime"]
+
+    def register_status_field(self, field, function):
+        self.status_fields[field] = function
+
+    def deregister_status_field(self, field):
+        self.status_fields.pop(field, None)
+
+    def get_enabled_plugins(self):
+        return self.enabled_plugins
+
+
+class FakeLabelPlugin(object):
+    def __init__(self, torrent_manager):
+        self.torrent_manager = torrent_manager
+
+    def _status_get_label(self, torrent_id):
+        return self.torrent_manager.torrents[torrent_id].label
+
+
+class FakeSessionStatus(object):
+    upload_rate = 0
+    disk_write_queue = 0
+
+
+class FakeSession(object):
+    def __init__(self, torrent_manager):
+        self.torrent_manager = torrent_manager
+        self.session_status = FakeSessionStatus()
+
+    def status(self):
+        return self.session_status
+
+    def get_torrent_status(self, predicate, flags=0):
+        self.torrent_manager.status_batches += 1
+        statuses = [FakeTorrentStatus(torrent) for torrent in self.torrent_manager.torrents.itervalues()]
+        return [status for status in statuses if predicate(status)]
+
+
+class FakeCore(object):
+    def __init__(self, torrent_manager):
+        self.torrentmanager = torrent_manager
+        self.session = FakeSession(torrent_manager)
+
+
+class FakeConfig(object):
+    """Mimics deluge.config.Config: a dict saved as JSON to config_file."""
+
+    def __init__(self, config_file, defaults):
+        self.config_file = config_file
+        self.config = json.loads(json.dumps(defaults))
+        self.saves = 0
+
+    def __getitem__(self, key):
+        return self.config[key]
+
+    def __setitem__(self, key, value):
+        self.config[key] = value
+
+    def __contains__(self, key):
+        return key in self.config
+
+    def save(self, filename=None):
+        self.saves += 1
+        with open(filename or self.config_file, "wb") as f:
+            f.write(json.dumps({"file": 1, "format": 1}, indent=2))
+            f.write(json.dumps(self.config, indent=2))
+
+
+class FakeDeluge(object):
+    """Holds the fake components and installs the deluge modules they back."""
+
+    def __init__(self, config_dir):
+        self.config_dir = config_dir
+        self.configs = {}
+        self.event_manager = FakeEventManager()
+        self.torrent_manager = FakeTorrentManager(self.event_manager)
+        self.plugin_manager = FakeCorePluginManager()
+        self.components = {
+            "TorrentManager": self.torrent_manager,
+            "EventManager": self.event_manager,
+            "CorePluginManager": self.plugin_manager,
+            "CorePlugin.Label": FakeLabelPlugin(self.torrent_manager),
+            "Core": FakeCore(self.torrent_manager),
+        }
+
+    def get_component(self, name):
+        return self.components[name]
+
+    def config_manager(self, filename, defaults=None):
+        if filename not in self.configs:
+            self.configs[filename] = FakeConfig(self.get_config_dir(filename), defaults or {})
+        return self.configs[filename]
+
+    def get_config_dir(self, filename=None):
+        if filename:
+            return os.path.join(self.config_dir, filename)
+        return self.config_dir
+
+    def install(self):
+        def module(name, **attrs):
+            mod = types.ModuleType(name)
+            mod.__dict__.update(attrs)
+            sys.modules[name] = mod
+            if "." in name:
+                parent, child = name.rsplit(".", 1)
+                setattr(sys.modules[parent], child, mod)
+            return mod
+
+        class CorePluginBase(object):
+            def __init__(self, plugin_name):
+                self._component_state = "Started"
+                self._component_timer = None
+
+        log = logging.getLogger("deluge")
+        module("deluge")
+        module("deluge.log", LOG=log)
+        module("deluge.plugins")
+        module("deluge.plugins.pluginbase", CorePluginBase=CorePluginBase)
+        module("deluge.component", get=self.get_component)
+        module("deluge.configmanager", ConfigManager=self.config_manager,
+               get_config_dir=self.get_config_dir)
+        module("deluge.event", DelugeEvent=DelugeEvent)
+        module("deluge.core")
+        module("deluge.core.rpcserver", export=lambda func: func)
@@ -0,0 +1,121 @@
+#
+# bulkstatus.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+from array import array
+
+# reading handles one by one is cheaper while fewer than 1/HANDLE_STATUS_RATIO
+# of the torrents are wanted, as the bulk call runs its filter for every torrent
+HANDLE_STATUS_RATIO = 32
+
+
+class StatusBuffer(object):
+    """The libtorrent status numbers of many torrents, read in one call.
+
+    A refresh asks the session for the status of all wanted torrents at once
+    instead of building a deluge status dict per torrent. The numbers are
+    kept in flat double arrays reused by every refresh, which only grow when
+    a refresh reads more torrents than any before it.
+    """
+
+    def __init__(self):
+        self.rows = {}  # torrent_id: row of the last refresh
+        self.seeding_time = array("d")
+        self.all_time_upload = array("d")
+        self.total_done = array("d")
+        self.refreshes = 0
+        self.grown = 0  # rows added to the arrays by all refreshes
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, torrent_id):
+        return torrent_id in self.rows
+
+    def refresh(self, session, torrents, torrent_ids):
+        """Reads the status of torrent_ids, torrents is the TorrentManager's dict."""
+        self.rows.clear()
+        if not torrent_ids:
+            return
+        self.refreshes += 1
+        wanted = set(torrent_ids)
+        if hasattr(session, "get_torrent_status") and len(wanted) * HANDLE_STATUS_RATIO >= len(torrents):
+            # a single round trip to the libtorrent thread for all torrents
+            statuses = session.get_torrent_status(lambda status: str(status.handle.info_hash()) in wanted, 0)
+            for status in statuses:
+                self._store(str(status.handle.info_hash()), status)
+        else:
+            for torrent_id in wanted:
+                torrent = torrents.get(torrent_id)
+                if torrent is not None:
+                    self._store(torrent_id, torrent.handle.status())
+
+    def _store(self, torrent_id, status):
+        row = len(self.rows)
+        if row == len(self.seeding_time):
+            self.seeding_time.append(0.0)
+            self.all_time_upload.append(0.0)
+            self.total_done.append(0.0)
+            self.grown += 1
+        self.seeding_time[row] = status.seeding_time
+        self.all_time_upload[row] = status.all_time_upload
+        self.total_done[row] = status.total_done
+        self.rows[torrent_id] = row
+
+    def get_seeding_time(self, torrent_id):
+        row = self.rows.get(torrent_id)
+        if row is None:
+            return None
+        return self.seeding_time[row]
+
+    def get_uploaded(self, torrent_id):
+        row = self.rows.get(torrent_id)
+        if row is None:
+            return None
+        return self.all_time_upload[row]
+
+    def get_ratio(self, torrent_id):
+        """Returns the ratio the way deluge reports it, -1 if nothing was downloaded."""
+        row = self.rows.get(torrent_id)
+        if row is None:
+            return None
+        if self.total_done[row] > 0:
+            return self.all_time_upload[row] / self.total_done[row]
+        return -1.0
+
+    def get_counters(self):
+        return {"capacity": len(self.seeding_time), "refreshes": self.refreshes, "grown": self.grown}
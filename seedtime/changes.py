@@ -0,0 +1,84 @@
+#
+# changes.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+import time
+from collections import deque
+
+
+class ChangeFeed(object):
+    """A versioned log of the most recent stop time changes.
+
+    Every change gets the next version number. Clients remember the version
+    they are up to date with and ask for the changes since then, if those
+    have already been dropped from the log they have to reload everything.
+    """
+
+    def __init__(self, size, on_change=None):
+        # start from the clock so versions keep increasing across restarts
+        self.version = int(time.time() * 1000)
+        self.changes = deque(maxlen=size)
+        self.on_change = on_change
+
+    def resize(self, size):
+        if size != self.changes.maxlen:
+            self.changes = deque(self.changes, maxlen=size)
+
+    def record(self, torrent_id, stop_time):
+        """Records a new stop time (None when removed) for the torrent."""
+        self.version += 1
+        self.changes.append((self.version, torrent_id, stop_time))
+        if self.on_change is not None:
+            self.on_change()
+        return self.version
+
+    def since(self, version):
+        """Returns {torrent_id: stop_time} of the changes after version.
+
+        Returns None if some of those changes are no longer in the log.
+        """
+        if version == self.version:
+            return {}
+        if version > self.version or not self.changes or self.changes[0][0] > version + 1:
+            return None
+        changes = {}
+        for change_version, torrent_id, stop_time in reversed(self.changes):
+            if change_version <= version:
+                break
+            changes.setdefault(torrent_id, stop_time)
+        return changes
@@ -0,0 +1,117 @@
+#
+# conditions.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+from array import array
+
+
+class StopCondition(object):
+    """Requirements a torrent has to meet on top of its seed time.
+
+    Once a torrent has seeded for its stop time it is stopped as soon as its
+    share ratio reaches min_ratio, or its average upload rate over the rate
+    window drops below min_upload_rate (in KiB/s). 0 disables a requirement.
+    """
+    __slots__ = ("min_ratio", "min_upload_rate")
+
+    def __init__(self, min_ratio=0, min_upload_rate=0):
+        for name, value in (("min_ratio", min_ratio), ("min_upload_rate", min_upload_rate)):
+            if not isinstance(value, (int, long, float)) or value < 0:
+                raise ValueError("Invalid %s %r, expected a number >= 0" % (name, value))
+        self.min_ratio = min_ratio
+        self.min_upload_rate = min_upload_rate
+
+    @classmethod
+    def from_dict(cls, values):
+        """Returns the condition set in values, or None if it sets none."""
+        condition = cls(values.get("min_ratio") or 0, values.get("min_upload_rate") or 0)
+        if condition.min_ratio > 0 or condition.min_upload_rate > 0:
+            return condition
+        return None
+
+    def __eq__(self, other):
+        return (isinstance(other, StopCondition) and self.min_ratio == other.min_ratio and
+                self.min_upload_rate == other.min_upload_rate)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def to_dict(self):
+        return {"min_ratio": self.min_ratio, "min_upload_rate": self.min_upload_rate}
+
+    def met(self, ratio, upload_rate):
+        """Returns the name of the requirement that was met, or None.
+
+        upload_rate is in bytes/s, None while the rate window is not full yet.
+        """
+        if self.min_ratio > 0 and ratio >= self.min_ratio:
+            return "ratio"
+        if self.min_upload_rate > 0 and upload_rate is not None and upload_rate < self.min_upload_rate * 1024:
+            return "upload_rate"
+        return None
+
+
+class UploadRateWindow(object):
+    """The uploaded totals of a torrent at its last size samples.
+
+    The samples are kept in a ring buffer of two flat double arrays, so a
+    torrent costs 16 bytes per sample however long it is tracked.
+    """
+    __slots__ = ("uploaded", "times", "index", "count")
+
+    def __init__(self, size):
+        self.uploaded = array("d", [0.0]) * size
+        self.times = array("d", [0.0]) * size
+        self.index = 0  # where the next sample goes
+        self.count = 0
+
+    def add(self, uploaded, now):
+        self.uploaded[self.index] = uploaded
+        self.times[self.index] = now
+        self.index = (self.index + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def rate(self):
+        """Returns the average upload rate (bytes/s) over the window, or None until it is full."""
+        if self.count < len(self.times):
+            return None
+        newest = self.index - 1
+        oldest = self.index
+        elapsed = self.times[newest] - self.times[oldest]
+        if elapsed <= 0:
+            return None
+        return max(0.0, self.uploaded[newest] - self.uploaded[oldest]) / elapsed
@@ -37,67 +37,645 @@
 #    statement from all source files in the program, then also delete it here.
 #
 
+import math
 import re
-from twisted.internet.task import LoopingCall, deferLater
+import time
+from collections import deque
+from twisted.internet.task import LoopingCall, cooperate
 from twisted.internet import reactor
+from twisted.internet.defer import Deferred
 from deluge.log import LOG as log
 from deluge.plugins.pluginbase import CorePluginBase
 import deluge.component as component
 import deluge.configmanager
 from deluge.core.rpcserver import export
+from deluge.event import DelugeEvent
+
+from bulkstatus import StatusBuffer
+from changes import ChangeFeed
+from conditions import StopCondition, UploadRateWindow
+from enforcer import EnforcementQueue
+from filters import FilterEngine, classify
+from persist import DebouncedSaver
+from policy import RemovalPolicy
+from scheduler import DeadlineScheduler
+from snapshot import read_snapshot, write_snapshot
+from stats import Stats
+from store import StopTimeStore, run_writes
+from worker import Worker
 
 CONFIG_DEFAULT = {
     "default_stop_time": 7,
+    "default_min_ratio": 0,  # share ratio that also stops torrents past their stop time, 0 to disable
+    "default_min_upload_rate": 0,  # upload rate (in KiB/s) below which torrents past their stop time stop, 0 to disable
+    "rate_window": 3600,  # the upload rate is averaged over this long (in seconds)
     "remove_torrent": False,
     "delay_time": 1,  # delay between adding torrent and setting initial seed time (in seconds)
+    "save_interval": 5,  # minimum time between writes of torrent stop time changes (in seconds)
+    "reconcile_interval": 60,  # fallback check for missed torrent state changes (in seconds)
+    "snapshot_interval": 300,  # how often the seeding times are saved for a quick restart (in seconds), 0 for only at shutdown
+    "max_actions_per_second": 10,  # rate limit for pausing/removing expired torrents, 0 for no limit
+    "removal_windows": [],  # "HH:MM-HH:MM" local times when torrents may be removed, empty for any time
+    "removal_max_upload_rate": 0,  # hold back removals while uploading faster (in KiB/s), 0 to disable
+    "removal_max_disk_queue": 0,  # hold back removals while more disk writes are queued, 0 to disable
+    "change_feed_size": 10000,  # stop time changes kept for get_changes
+    "tracker_cache_size": 4096,  # tracker urls whose first matching filter is remembered
+    "filter_time_budget": 50,  # filters whose regex search takes longer are skipped (in milliseconds), 0 to disable
+    "collect_stats": True,  # keep timings and counters for get_stats
+    "stats_log_interval": 0,  # log a stats summary this often (in seconds), 0 to disable
+    "worker_threads": 2,  # threads for filter matching and file writes, 0 to do them on the reactor
+    "worker_max_pending": 64,  # queued worker calls after which new ones run on the reactor
     "filter_list": [], #example: {'field': 'tracker', 'filter': ".*", 'stop_time': 7.0}],
-    "torrent_stop_times": {}  # torrent_id: stop_time (in hours)
 }
 
+class SeedTimeChangedEvent(DelugeEvent):
+    """
+    Emitted when stop times have changed.
+    """
+    def __init__(self, previous_version, version, changes):
+        """
+        :param previous_version: the change feed version of the previous event
+        :param version: the change feed version after these changes
+        :param changes: dict of torrent_id: stop_time (None if removed), or
+            None if the changes have to be fetched with get_stop_times
+        """
+        self._args = [previous_version, version, changes]
+
+PRUNE_CHUNK = 200  # stop times checked per reactor iteration when pruning
+REAPPLY_CHUNK = 50  # torrents classified per reactor iteration by reapply_filters
+REMOVAL_CHECK_INTERVAL = 60  # how often held back removals are retried (in seconds)
+
 class Core(CorePluginBase):
 
     #update_interval = 30
 
     def enable(self):
         self.config = deluge.configmanager.ConfigManager("seedtime.conf", CONFIG_DEFAULT)
-        self.torrent_stop_times = self.config["torrent_stop_times"]
-        self.delay_time = self.config["delay_time"]
+        self.stats = Stats(self.config["collect_stats"])
+        started = self.stats.clock()
+        # torrent_id: stop_time (in days)
+        self.torrent_stop_times = StopTimeStore(deluge.configmanager.get_config_dir("seedtime.journal"))
+        self.migrate_stop_times()
+        # torrent_id: the StopCondition parts, only for torrents that have one
+        self.min_ratios = StopTimeStore(deluge.configmanager.get_config_dir("seedtime.ratio.journal"))
+        self.min_upload_rates = StopTimeStore(deluge.configmanager.get_config_dir("seedtime.upload_rate.journal"))
+        self.changes = ChangeFeed(self.config["change_feed_size"], self.on_stop_times_changed)
+        self.changes_emitted = self.changes.version
+        self.changes_timer = None
+        self.worker = Worker(self.config["worker_threads"], self.config["worker_max_pending"])
+        self.worker.start()
+        self.saver = DebouncedSaver(self.save_stop_times, self.config["save_interval"])
+        self.shutdown_trigger = reactor.addSystemEventTrigger("before", "shutdown", self.on_shutdown)
+        self.filters = FilterEngine(self.config["filter_list"], strict=False,
+                                    tracker_cache_size=self.config["tracker_cache_size"],
+                                    time_budget=self.config["filter_time_budget"] / 1000.0)
+        for index, pattern, error in self.filters.invalid:
+            log.error("seedtime ignoring invalid filter #%d %r: %s" % (index, pattern, error))
         self.torrent_manager = component.get("TorrentManager")
         self.plugin = component.get("CorePluginManager")
         self.plugin.register_status_field("seed_stop_time", self._status_get_seed_stop_time)
         self.plugin.register_status_field("seed_time_remaining", self._status_get_remaining_seed_time)
-        self.torrent_manager = component.get("TorrentManager")
 
-        component.get("EventManager").register_event_handler("TorrentAddedEvent", self.post_torrent_add)
-        component.get("EventManager").register_event_handler("TorrentRemovedEvent", self.post_torrent_remove)
+        # the scheduler holds exactly the torrents that are seeding and have a stop time
+        self.scheduler = DeadlineScheduler()
+        self.seeding_times = {}  # torrent_id: last known seeding time of unscheduled torrents
+        self.waiting = set()  # torrents past their stop time until their StopCondition is met
+        self.rate_windows = {}  # torrent_id: UploadRateWindow of torrents with an upload rate condition
+        self.status_buffer = StatusBuffer()
 
+        # restored once the torrents are loaded, a session that already runs
+        # may have seeded without the plugin since the snapshot was written
+        self.snapshot_filename = deluge.configmanager.get_config_dir("seedtime.snapshot")
+        self.snapshot = None
+        self.snapshot_size = 0
+        if not self.torrent_manager.session_started:
+            snapshot_started = self.stats.clock()
+            self.snapshot = read_snapshot(self.snapshot_filename)
+            self.stats.observe("snapshot_load", snapshot_started)
+        self.snapshot_call = LoopingCall(self.write_snapshot)
+        self.deadline_timer = None
+        self.enforcer = EnforcementQueue(self.stop_torrent, self.config["max_actions_per_second"])
+
+        # torrents that were paused because they could not be removed yet
+        try:
+            self.removal_policy = self.get_removal_policy(self.config)
+        except ValueError, e:
+            log.error("seedtime ignoring removal windows: %s" % e)
+            self.removal_policy = RemovalPolicy()
+        self.pending_removals = set(self.config.config.get("pending_removals", []))
+        self.pending_removals_dirty = False
+        self.remover = EnforcementQueue(self.remove_torrent, self.config["max_actions_per_second"])
+        self.removal_call = LoopingCall(self.check_removals)
+        self.removal_call.start(REMOVAL_CHECK_INTERVAL, now=False)
+
+        event_manager = component.get("EventManager")
+        event_manager.register_event_handler("TorrentAddedEvent", self.post_torrent_add)
+        event_manager.register_event_handler("TorrentRemovedEvent", self.post_torrent_remove)
+        event_manager.register_event_handler("TorrentStateChangedEvent", self.on_torrent_state_changed)
+        event_manager.register_event_handler("TorrentFinishedEvent", self.on_torrent_finished)
+
+        self.pending_filters = deque()  # (due time, torrent_id) of added torrents
+        self.filter_timer = None
+        self.prune_task = None
+        self.prune_waiters = []
+        self.reapply_task = None
+        self.reapply_progress = None
         self.looping_call = LoopingCall(self.update_checker)
-        deferLater(reactor, 5, self.start_looping)
+        # start as soon as the torrents are loaded, at once if they already are
+        self.start_call = None
+        self.waiting_for_session = not self.torrent_manager.session_started
+        if self.waiting_for_session:
+            event_manager.register_event_handler("SessionStartedEvent", self.start_looping)
+        else:
+            self.start_call = reactor.callLater(0, self.start_looping)
+        self.stats_call = LoopingCall(self.log_stats)
+        if self.config["stats_log_interval"] > 0:
+            self.stats_call.start(self.config["stats_log_interval"], now=False)
+        self.stats.observe("enable", started)
 
     def start_looping(self):
+        """The first reconcile pass schedules every seeding torrent from its stop time."""
+        self.start_call = None
+        if self.waiting_for_session:
+            self.waiting_for_session = False
+            component.get("EventManager").deregister_event_handler("SessionStartedEvent", self.start_looping)
         log.warning('seedtime loop starting')
-        self.looping_call.start(10)
+        started = self.stats.clock()
+        if self.snapshot is not None:
+            self.restore_snapshot(self.snapshot)
+            self.snapshot = None
+        self.looping_call.start(self.config["reconcile_interval"])
+        if self.config["snapshot_interval"] > 0:
+            self.snapshot_call.start(self.config["snapshot_interval"], now=False)
+        self.stats.observe("warm_start", started)
+        # torrents removed while the plugin was disabled
+        self.prune_stop_times()
 
     def disable(self):
         self.plugin.deregister_status_field("seed_stop_time")
         self.plugin.deregister_status_field("seed_time_remaining")
+        event_manager = component.get("EventManager")
+        event_manager.deregister_event_handler("TorrentAddedEvent", self.post_torrent_add)
+        event_manager.deregister_event_handler("TorrentRemovedEvent", self.post_torrent_remove)
+        event_manager.deregister_event_handler("TorrentStateChangedEvent", self.on_torrent_state_changed)
+        event_manager.deregister_event_handler("TorrentFinishedEvent", self.on_torrent_finished)
+        if self.waiting_for_session:
+            self.waiting_for_session = False
+            event_manager.deregister_event_handler("SessionStartedEvent", self.start_looping)
+        if self.start_call is not None and self.start_call.active():
+            self.start_call.cancel()
+        self.start_call = None
+        # waits for the queued writes, the final ones below run on the reactor
+        self.worker.stop()
         if self.looping_call.running:
+            # only once running, before that the snapshot has not been restored
+            self.write_snapshot()
             self.looping_call.stop()
+        if self.snapshot_call.running:
+            self.snapshot_call.stop()
+        if self.stats_call.running:
+            self.stats_call.stop()
+        if self.removal_call.running:
+            self.removal_call.stop()
+        self.remover.stop()
+        if self.deadline_timer is not None and self.deadline_timer.active():
+            self.deadline_timer.cancel()
+        self.deadline_timer = None
+        self.enforcer.stop()
+        if self.changes_timer is not None and self.changes_timer.active():
+            self.changes_timer.cancel()
+        self.changes_timer = None
+        if self.filter_timer is not None and self.filter_timer.active():
+            self.filter_timer.cancel()
+        self.filter_timer = None
+        self.pending_filters.clear()
+        if self.prune_task is not None:
+            self.prune_task.stop()
+        if self.reapply_task is not None:
+            self.reapply_task.stop()
+        self.scheduler.clear()
+        self.seeding_times.clear()
+        self.waiting.clear()
+        self.rate_windows.clear()
+        if self.shutdown_trigger is not None:
+            reactor.removeSystemEventTrigger(self.shutdown_trigger)
+            self.shutdown_trigger = None
+        self.saver.flush(force=True)
+
+    def on_shutdown(self):
+        self.shutdown_trigger = None
+        self.worker.stop()
+        self.saver.flush(force=True)
 
     def update(self):
         pass
 
+    def migrate_stop_times(self):
+        """Move the stop times older versions kept in seedtime.conf to the journal."""
+        if "torrent_stop_times" not in self.config.config:
+            return
+        stop_times = self.config.config.pop("torrent_stop_times")
+        log.info("seedtime moving %d stop times out of seedtime.conf" % len(stop_times))
+        self.torrent_stop_times.update(stop_times)
+        self.torrent_stop_times.compact()
+        self.save_config()
+
+    def prune_stop_times(self):
+        """Drop the stop times of torrents that no longer exist.
+
+        The check runs in chunks between other reactor work. Returns a Deferred
+        firing with the number of removed stop times.
+        """
+        d = Deferred()
+        self.prune_waiters.append(d)
+        if self.prune_task is None:
+            removed = [0]
+            self.prune_task = cooperate(self._prune_stop_times(removed))
+            self.prune_task.whenDone().addBoth(self._on_pruned, removed)
+        return d
+
+    def _prune_stop_times(self, removed):
+        torrents = self.torrent_manager.torrents
+        for index, torrent_id in enumerate(list(self.torrent_stop_times)):
+            if torrent_id not in torrents:
+                self.torrent_stop_times.pop(torrent_id)
+                self.seeding_times.pop(torrent_id, None)
+                self.changes.record(torrent_id, None)
+                removed[0] += 1
+            if index % PRUNE_CHUNK == PRUNE_CHUNK - 1:
+                yield None
+        for store in (self.min_ratios, self.min_upload_rates):
+            for index, torrent_id in enumerate(list(store)):
+                if torrent_id not in torrents:
+                    store.pop(torrent_id)
+                if index % PRUNE_CHUNK == PRUNE_CHUNK - 1:
+                    yield None
+
+    def _on_pruned(self, result, removed):
+        self.prune_task = None
+        waiters, self.prune_waiters = self.prune_waiters, []
+        if removed[0]:
+            log.info("seedtime removed %d stop times of torrents that no longer exist" % removed[0])
+            self.saver.mark_dirty()
+        self.stats.incr("stop_times_pruned", removed[0])
+        for d in waiters:
+            d.callback(removed[0])
+
+    def save_config(self):
+        started = self.stats.clock()
+        # Config.save writes a new file and moves it into place, it logs and
+        # returns False if that fails
+        if self.config.save() is False:
+            log.error("seedtime could not save seedtime.conf")
+        self.stats.observe("config_save", started)
+
+    def save_stop_times(self):
+        """Write the journals on the worker, returns a Deferred fired once written."""
+        if self.pending_removals_dirty:
+            # deluge's Config is not thread safe, it is saved here
+            self.pending_removals_dirty = False
+            self.config.config["pending_removals"] = sorted(self.pending_removals)
+            self.save_config()
+        writes = []
+        for store in (self.torrent_stop_times, self.min_ratios, self.min_upload_rates):
+            write = store.prepare_flush()
+            if write is not None:
+                writes.append(write)
+        if not writes:
+            return None
+        d = self.worker.run(run_writes, writes)
+        d.addCallback(self._on_stop_times_saved, self.worker)
+        return d
+
+    def is_current(self, worker):
+        """False for results of a worker stopped by disable, they arrive late."""
+        return worker is self.worker and worker.running
+
+    def _on_stop_times_saved(self, seconds, worker):
+        if not self.is_current(worker):
+            return
+        self.stats.add("stop_times_save", seconds)
+
+    def log_stats(self):
+        log.info("seedtime stats: %s" % self.stats.summary())
+
+    def restore_snapshot(self, snapshot):
+        """Schedule the seeding torrents from the seeding times in the snapshot.
+
+        No status is read, check_deadlines still confirms the seeding time of
+        every torrent that expires. Torrents that were removed or got another
+        stop time since the snapshot are left to the reconcile pass.
+        """
+        started = self.stats.clock()
+        now = time.time()
+        if snapshot.written_at > now:
+            log.warning("seedtime ignoring snapshot written in the future")
+            return
+        torrents = self.torrent_manager.torrents
+        restored = skipped = 0
+        for torrent_id, seeding_time, stop_time in snapshot:
+            torrent = torrents.get(torrent_id)
+            if torrent is None or self.torrent_stop_times.get(torrent_id) != stop_time:
+                skipped += 1
+                continue
+            if torrent.state == "Seeding":
+                self.scheduler.schedule(torrent_id, now + stop_time * 3600.0 * 24.0 - seeding_time)
+            else:
+                self.seeding_times[torrent_id] = seeding_time
+            restored += 1
+        log.info("seedtime restored %d torrents from the snapshot, skipped %d" % (restored, skipped))
+        self.stats.incr("snapshot_restored", restored)
+        self.stats.incr("snapshot_skipped", skipped)
+        self.stats.observe("snapshot_restore", started)
+
+    def write_snapshot(self):
+        """Save the seeding time of every torrent with a stop time that has a known one."""
+        started = self.stats.clock()
+        now = time.time()
+        stop_times = self.torrent_stop_times
+        rows = []
+        for torrent_id in self.scheduler:
+            stop_time = stop_times.get(torrent_id)
+            if stop_time is not None:
+                remaining = max(0, self.scheduler.get(torrent_id) - now)
+                rows.append((torrent_id, stop_time * 3600.0 * 24.0 - remaining, stop_time))
+        for torrent_id, seeding_time in self.seeding_times.iteritems():
+            stop_time = stop_times.get(torrent_id)
+            if stop_time is not None:
+                rows.append((torrent_id, seeding_time, stop_time))
+        # the LoopingCall waits for the write, so they never overlap
+        d = self.worker.run(write_snapshot, self.snapshot_filename, now, rows)
+        d.addCallbacks(self._on_snapshot_written, self._on_snapshot_failed, callbackArgs=(self.worker,))
+        d.addBoth(self._on_snapshot_done, started, self.worker)
+        return d
+
+    def _on_snapshot_written(self, size, worker):
+        if self.is_current(worker):
+            self.snapshot_size = size
+
+    def _on_snapshot_failed(self, failure):
+        failure.trap(IOError, OSError)
+        log.error("seedtime could not write the snapshot: %s" % failure.getErrorMessage())
+
+    def _on_snapshot_done(self, result, started, worker):
+        if self.is_current(worker):
+            self.stats.observe("snapshot_write", started)
+        return result
+
     def update_checker(self):
-        """Check if any torrents have reached their stop seed time."""
-        for torrent in component.get("Core").torrentmanager.torrents.values():
-            if not (torrent.state == "Seeding" and torrent.torrent_id in self.torrent_stop_times):
+        """Bring the deadline scheduler in line with the current torrent states.
+
+        State changes normally arrive as events, this slow pass only catches
+        the ones that were missed. Only torrents that started or stopped seeding
+        since the last run need their status.
+
+        The same pass checks the StopCondition of the torrents past their stop
+        time, and samples the upload of the ones with an upload rate condition
+        whose stop time falls within the rate window. The status of all these
+        torrents is read with a single fetch_status.
+        """
+        started = self.stats.clock()
+        torrents = self.torrent_manager.torrents
+        resumed = []
+        for torrent_id, torrent in torrents.iteritems():
+            if torrent.state == "Seeding" and torrent_id in self.torrent_stop_times:
+                if torrent_id in self.enforcer or torrent_id in self.pending_removals:
+                    continue  # already expired, waiting for the rate limited queue
+                if torrent_id not in self.scheduler and torrent_id not in self.waiting:
+                    resumed.append(torrent_id)
+            elif torrent_id in self.scheduler:
+                self.unschedule_torrent(torrent_id)
+            elif torrent_id in self.waiting:
+                self.stop_waiting(torrent_id)
+
+        sampled = list(self.waiting)
+        horizon = time.time() + self.config["rate_window"]
+        for torrent_id, min_upload_rate in self.min_upload_rates.iteritems():
+            deadline = self.scheduler.get(torrent_id)
+            if min_upload_rate > 0 and deadline is not None and deadline <= horizon:
+                sampled.append(torrent_id)
+
+        status = self.fetch_status(resumed + sampled)
+        for torrent_id in resumed:
+            seeding_time = status.get_seeding_time(torrent_id)
+            if seeding_time is not None:
+                self.schedule_torrent(torrent_id, seeding_time)
+        self.arm_deadline_timer()
+        self.check_conditions(sampled, status, sample=True)
+        self.stats.observe("update_checker", started)
+        self.stats.incr("update_checker_torrents", len(torrents))
+
+    def schedule_torrent(self, torrent_id, seeding_time=None):
+        """(Re)compute the absolute stop deadline of a torrent."""
+        self.waiting.discard(torrent_id)
+        torrent = self.torrent_manager.torrents.get(torrent_id)
+        stop_time = self.torrent_stop_times.get(torrent_id)
+        if torrent is None or stop_time is None or torrent.state != "Seeding":
+            self.unschedule_torrent(torrent_id)
+            return
+        if seeding_time is None:
+            seeding_time = torrent.get_status(['seeding_time'])['seeding_time']
+        self.seeding_times.pop(torrent_id, None)
+        self.scheduler.schedule(torrent_id, time.time() + stop_time * 3600.0 * 24.0 - seeding_time)
+
+    def unschedule_torrent(self, torrent_id):
+        """Drop the deadline of a torrent, keeping the seeding time it implies."""
+        deadline = self.scheduler.get(torrent_id)
+        if deadline is None:
+            return
+        self.scheduler.cancel(torrent_id)
+        stop_time = self.torrent_stop_times.get(torrent_id)
+        if stop_time is not None:
+            remaining = max(0, deadline - time.time())
+            self.seeding_times[torrent_id] = stop_time * 3600.0 * 24.0 - remaining
+
+    def arm_deadline_timer(self):
+        """Make sure a single reactor call is pending for the earliest deadline."""
+        deadline = self.scheduler.next_deadline()
+        if deadline is None:
+            if self.deadline_timer is not None and self.deadline_timer.active():
+                self.deadline_timer.cancel()
+            self.deadline_timer = None
+            return
+        delay = max(0, deadline - time.time())
+        if self.deadline_timer is not None and self.deadline_timer.active():
+            self.deadline_timer.reset(delay)
+        else:
+            self.deadline_timer = reactor.callLater(delay, self.check_deadlines)
+
+    def check_deadlines(self):
+        """Stop every torrent whose deadline has passed."""
+        started = self.stats.clock()
+        self.deadline_timer = None
+        expired = self.scheduler.pop_expired(time.time())
+        seeding = []
+        for torrent_id in expired:
+            torrent = self.torrent_manager.torrents.get(torrent_id)
+            if torrent is None or torrent.state != "Seeding" or torrent_id not in self.torrent_stop_times:
+                self.seeding_times.pop(torrent_id, None)
                 continue
-            stop_time = self.torrent_stop_times[torrent.torrent_id]
-            if torrent.get_status(['seeding_time'])['seeding_time'] > stop_time * 3600.0 * 24.0:
-                if self.config['remove_torrent']:
-                    self.torrent_manager.remove(torrent.torrent_id)
+            seeding.append(torrent_id)
+        status = self.fetch_status(seeding)
+        conditional = []
+        for torrent_id in seeding:
+            stop_time = self.torrent_stop_times[torrent_id]
+            seeding_time = status.get_seeding_time(torrent_id)
+            if seeding_time is None:  # gone from the session
+                continue
+            if seeding_time >= stop_time * 3600.0 * 24.0:
+                self.seeding_times[torrent_id] = seeding_time
+                if self.get_condition(torrent_id) is None:
+                    self.enforcer.push(torrent_id)
                 else:
-                    torrent.pause()
+                    self.waiting.add(torrent_id)
+                    conditional.append(torrent_id)
+            else:  # seeding time lagged behind the wall clock, check again later
+                self.schedule_torrent(torrent_id, seeding_time)
+        self.arm_deadline_timer()
+        self.check_conditions(conditional, status)
+        self.stats.observe("check_deadlines", started)
+        self.stats.incr("deadlines_expired", len(expired))
+
+    def fetch_status(self, torrent_ids):
+        """Reads the status of the torrents into the StatusBuffer in one call.
+
+        The buffer is overwritten by the next fetch_status.
+        """
+        if torrent_ids:
+            started = self.stats.clock()
+            self.status_buffer.refresh(component.get("Core").session, self.torrent_manager.torrents, torrent_ids)
+            self.stats.observe("status_fetch", started)
+            self.stats.incr("status_fetched", len(torrent_ids))
+        else:
+            self.status_buffer.refresh(None, None, ())
+        return self.status_buffer
+
+    def check_conditions(self, torrent_ids, status, sample=False):
+        """Stop the waiting torrents among torrent_ids whose StopCondition is met.
+
+        status is the StatusBuffer holding the torrents. With sample the current
+        upload of every torrent with an upload rate condition is added to its
+        UploadRateWindow first.
+        """
+        if not torrent_ids:
+            return
+        started = self.stats.clock()
+        now = time.time()
+        torrents = self.torrent_manager.torrents
+        for torrent_id in torrent_ids:
+            condition = self.get_condition(torrent_id)
+            torrent = torrents.get(torrent_id)
+            if condition is None or torrent is None or torrent.state != "Seeding" or torrent_id not in status:
+                continue
+            window = None
+            if condition.min_upload_rate > 0:
+                window = self.rate_windows.get(torrent_id)
+                if window is None and sample:
+                    window = self.rate_windows[torrent_id] = UploadRateWindow(self.get_rate_window_size())
+                if sample:
+                    window.add(status.get_uploaded(torrent_id), now)
+            if torrent_id not in self.waiting:
+                continue
+            met = condition.met(status.get_ratio(torrent_id), window.rate() if window is not None else None)
+            if met is not None:
+                self.stop_waiting(torrent_id)
+                self.stats.incr("stopped_by_" + met)
+                self.enforcer.push(torrent_id)
+        self.stats.observe("check_conditions", started)
+
+    def stop_waiting(self, torrent_id):
+        """Forget the condition checks of a torrent that stopped seeding."""
+        self.waiting.discard(torrent_id)
+        self.rate_windows.pop(torrent_id, None)
+
+    def get_rate_window_size(self):
+        """The number of samples one update_checker pass apart that span the rate window."""
+        return max(2, int(math.ceil(float(self.config["rate_window"]) / self.config["reconcile_interval"])) + 1)
+
+    def get_condition(self, torrent_id):
+        """Returns the StopCondition of the torrent, or None."""
+        min_ratio = self.min_ratios.get(torrent_id, 0)
+        min_upload_rate = self.min_upload_rates.get(torrent_id, 0)
+        if min_ratio > 0 or min_upload_rate > 0:
+            return StopCondition(min_ratio, min_upload_rate)
+        return None
+
+    def update_condition(self, torrent_id, condition):
+        """Sets the StopCondition of the torrent, returns True if it changed."""
+        changed = False
+        for store, value in ((self.min_ratios, condition.min_ratio if condition else 0),
+                             (self.min_upload_rates, condition.min_upload_rate if condition else 0)):
+            if value > 0:
+                if store.get(torrent_id) != float(value):
+                    store[torrent_id] = value
+                    changed = True
+            elif store.pop(torrent_id, None) is not None:
+                changed = True
+        return changed
+
+    def stop_torrent(self, torrent_id):
+        torrent = self.torrent_manager.torrents.get(torrent_id)
+        # skip torrents that stopped seeding or got a new stop time while queued
+        if torrent is None or torrent.state != "Seeding" or torrent_id in self.scheduler:
+            return
+        if torrent_id not in self.torrent_stop_times:
+            return
+        if self.config['remove_torrent']:
+            reason = self.get_removal_block()
+            if reason is None:
+                self.torrent_manager.remove(torrent_id)
+                self.stats.incr("torrents_removed")
+                return
+            # stop seeding now, the removal follows once it is allowed
+            log.debug("seedtime holding back removal of %s: %s" % (torrent_id, reason))
+            self.pending_removals.add(torrent_id)
+            self.pending_removals_dirty = True
+            self.saver.mark_dirty()
+        torrent.pause()
+        self.stats.incr("torrents_paused")
+
+    def get_removal_policy(self, config):
+        return RemovalPolicy(config["removal_windows"], config["removal_max_upload_rate"],
+                             config["removal_max_disk_queue"])
+
+    def get_removal_block(self):
+        """Returns the reason torrents may not be removed now, or None."""
+        if self.removal_policy.unrestricted:
+            return None
+        session_status = None
+        if self.removal_policy.needs_session_status:
+            session_status = component.get("Core").session.status()
+        return self.removal_policy.check(session_status)
+
+    def check_removals(self):
+        """Queue the held back removals if they are allowed now."""
+        if not self.pending_removals:
+            return
+        reason = self.get_removal_block()
+        if reason is not None:
+            log.debug("seedtime holding back %d removals: %s" % (len(self.pending_removals), reason))
+            return
+        for torrent_id in self.pending_removals:
+            self.remover.push(torrent_id)
+
+    def remove_torrent(self, torrent_id):
+        if torrent_id not in self.pending_removals:
+            return
+        if self.removal_policy.needs_session_status:
+            reason = self.get_removal_block()
+            if reason is not None:  # got busy again, wait for the next check
+                self.remover.stop()
+                return
+        self.discard_pending_removal(torrent_id)
+        if torrent_id in self.torrent_manager.torrents:
+            self.torrent_manager.remove(torrent_id)
+            self.stats.incr("torrents_removed")
+
+    def discard_pending_removal(self, torrent_id):
+        if torrent_id in self.pending_removals:
+            self.pending_removals.discard(torrent_id)
+            self.pending_removals_dirty = True
+            self.saver.mark_dirty()
 
     ## Plugin hooks ##
     def post_torrent_add(self, torrent_id, from_state=None):
@@ -108,81 +686,474 @@ class Core(CorePluginBase):
         # wait to apply initial seedtime filter
         # other plugins (i.e. label) need to run their post_torrent_add hooks first
         # or the user may wish to set the label before we apply the seed time filter
-        deferLater(reactor, self.delay_time, self.apply_filter, torrent_id)
+        # added torrents are collected and filtered in batches by a single timer
+        self.pending_filters.append((time.time() + self.config["delay_time"], torrent_id))
+        if self.filter_timer is None:
+            self.filter_timer = reactor.callLater(self.config["delay_time"], self.apply_pending_filters)
+
+    def apply_pending_filters(self):
+        self.filter_timer = None
+        now = time.time()
+        torrent_ids = []
+        while self.pending_filters and self.pending_filters[0][0] <= now:
+            torrent_ids.append(self.pending_filters.popleft()[1])
+        self.apply_filters(torrent_ids)
+        if self.pending_filters:
+            delay = max(0, self.pending_filters[0][0] - now)
+            self.filter_timer = reactor.callLater(delay, self.apply_pending_filters)
 
     def apply_filter(self, torrent_id):
-        for filter_list in self.config['filter_list']:
-            search_strs = None
-            stop_time = None
-            if filter_list['field'] == 'label':
-                if 'Label' in component.get("CorePluginManager").get_enabled_plugins():
-                    try:  # If label plugin changes and code no longer works, ignore this filter
-                        # Can't seem to retrieve label from torrent manager so we must use the label plugin methods
-                        # label_str = component.get("TorrentManager")[torrent_id].get_status(["label"])
-                        label_str = component.get("CorePlugin.Label")._status_get_label(torrent_id)
-                        if len(label_str) > 0:
-                            search_strs = [label_str]
-                    except:
-                        log.debug('Cannot find torrent label')
-            elif filter_list['field'] == 'tracker':
-                torrent = component.get("TorrentManager")[torrent_id]
-                trackers = torrent.get_status(["trackers"])["trackers"]
-                search_strs = [tracker["url"] for tracker in trackers]
-            elif filter_list['field'] == 'default':
-                search_strs = ['']
-            else:  # unknown filter, ignore
-                pass
-
-            if search_strs is not None:
-                for search_str in search_strs:
-                    if re.search(filter_list['filter'], search_str) is not None:
-                        stop_time = filter_list['stop_time']
-                        log.debug('filter %s matched %s %s' %
-                                  (filter_list['filter'], filter_list['field'], search_str))
-                if stop_time is not None:
-                    log.debug('applying stop.... time %r' % stop_time)
-                    self.set_torrent(torrent_id, stop_time)
-                    break  # stop looking through filter list
-        else: #apply default if no filters match
-            stop_time = self.config['default_stop_time']
-            if stop_time > 0:
+        self.apply_filters([torrent_id])
+
+    def apply_filters(self, torrent_ids):
+        """Set the stop times of the torrents from the filters, persisting them once.
+
+        The labels and trackers are read here, the rules are matched on the
+        worker. Returns a Deferred fired once the stop times are set.
+        """
+        filters = self.filters
+        batch = []
+        for torrent_id in torrent_ids:
+            if torrent_id not in self.torrent_manager.torrents:  # removed while waiting
+                continue
+            values = dict((field, self.get_filter_values(torrent_id, field)) for field in filters.fields)
+            batch.append((torrent_id, values))
+        d = self.worker.run(classify, filters, batch)
+        d.addCallback(self._on_classified, filters, self.worker)
+        return d
+
+    def _on_classified(self, results, filters, worker):
+        if not self.is_current(worker):
+            # the plugin was disabled while matching
+            return
+        if filters is not self.filters:
+            # the filter_list changed while matching
+            return self.apply_filters([torrent_id for torrent_id, rule, seconds in results])
+        changed = False
+        for torrent_id, rule, seconds in results:
+            self.stats.add("apply_filter", seconds)
+            if torrent_id not in self.torrent_manager.torrents:  # removed while matching
+                continue
+            stop_time, condition = self.get_rule_settings(rule)
+            if stop_time is not None:
                 log.debug('applying stop.... time %r' % stop_time)
-                self.set_torrent(torrent_id, stop_time)
+                self.update_condition(torrent_id, condition)
+                self.update_stop_time(torrent_id, stop_time)
+                changed = True
+        if changed:
+            self.saver.mark_dirty()
+            self.arm_deadline_timer()
+
+    def get_filter_settings(self, torrent_id, get_values=None):
+        """Returns the (stop_time, condition) the filters assign to the torrent.
+
+        stop_time is None if the torrent gets no stop time, condition the
+        StopCondition of the matched rule or the defaults, or None.
+        """
+        if get_values is None:
+            get_values = lambda field: self.get_filter_values(torrent_id, field)
+        started = self.stats.clock()
+        rule = self.filters.match(get_values)
+        self.stats.observe("apply_filter", started)
+        return self.get_rule_settings(rule)
+
+    def get_rule_settings(self, rule):
+        """Returns the (stop_time, condition) of a matched rule, or the defaults if None."""
+        if rule is not None:
+            log.debug('filter %s matched %s' % (rule.pattern, rule.field))
+            self.stats.rule_hit(rule.index)
+            return rule.stop_time, rule.condition
+        # apply default if no filters match
+        self.stats.incr("default_stop_time_applied")
+        stop_time = self.config['default_stop_time']
+        if stop_time > 0:
+            return stop_time, StopCondition.from_dict({"min_ratio": self.config["default_min_ratio"],
+                                                       "min_upload_rate": self.config["default_min_upload_rate"]})
+        return None, None
+
+    def get_filter_values(self, torrent_id, field):
+        """Returns the strings the filters for field are matched against."""
+        if field == 'label':
+            if 'Label' in self.plugin.get_enabled_plugins():
+                try:  # If label plugin changes and code no longer works, ignore this filter
+                    # Can't seem to retrieve label from torrent manager so we must use the label plugin methods
+                    # label_str = component.get("TorrentManager")[torrent_id].get_status(["label"])
+                    label_str = component.get("CorePlugin.Label")._status_get_label(torrent_id)
+                    if len(label_str) > 0:
+                        return [label_str]
+                except:
+                    log.debug('Cannot find torrent label')
+        elif field == 'tracker':
+            torrent = self.torrent_manager[torrent_id]
+            trackers = torrent.get_status(["trackers"])["trackers"]
+            return [tracker["url"] for tracker in trackers]
+        elif field == 'default':
+            return ['']
+        return None
+
+    def _reapply_filters(self, torrent_ids, scope, progress):
+        label = scope.get("label")
+        tracker = re.compile(scope["tracker"]) if scope.get("tracker") else None
+        stop_times = progress["stop_times"]
+        for index, torrent_id in enumerate(torrent_ids):
+            if index % REAPPLY_CHUNK == REAPPLY_CHUNK - 1:
+                yield None
+            progress["processed"] = index + 1
+            if torrent_id not in self.torrent_manager.torrents:
+                continue
+            values = {}
+            def get_values(field):
+                if field not in values:
+                    values[field] = self.get_filter_values(torrent_id, field)
+                return values[field]
+            if label is not None and get_values("label") != [label]:
+                continue
+            if tracker is not None and not [url for url in get_values("tracker") if tracker.search(url)]:
+                continue
+            progress["matched"] += 1
+            stop_time, condition = self.get_filter_settings(torrent_id, get_values)
+            if stop_time is None:
+                continue
+            condition_changed = condition != self.get_condition(torrent_id)
+            if self.torrent_stop_times.get(torrent_id) != stop_time:
+                stop_times[torrent_id] = stop_time
+            elif not condition_changed:
+                continue
+            if condition_changed:
+                progress["conditions_changed"] += 1
+            if not progress["dry_run"]:
+                self.update_condition(torrent_id, condition)
+                self.update_stop_time(torrent_id, stop_time)
+
+    def _on_reapplied(self, result, progress, d):
+        self.reapply_task = None
+        progress["running"] = False
+        progress["cancelled"] = progress["processed"] < progress["total"]
+        if (progress["stop_times"] or progress["conditions_changed"]) and not progress["dry_run"]:
+            self.saver.mark_dirty()
+            self.arm_deadline_timer()
+        log.info("seedtime reapplied filters to %(processed)d of %(total)d torrents, %(matched)d in scope" % progress)
+        d.callback(self.get_reapply_progress(include_stop_times=progress["dry_run"]))
 
     def post_torrent_remove(self, torrent_id):
         log.debug("seedtime post_torrent_remove")
         if torrent_id in self.torrent_stop_times:
             del self.torrent_stop_times[torrent_id]
+            self.changes.record(torrent_id, None)
+            self.saver.mark_dirty()
+        if self.update_condition(torrent_id, None):
+            self.saver.mark_dirty()
+        self.scheduler.cancel(torrent_id)
+        self.enforcer.discard(torrent_id)
+        self.stop_waiting(torrent_id)
+        self.discard_pending_removal(torrent_id)
+        self.seeding_times.pop(torrent_id, None)
+
+    def on_stop_times_changed(self):
+        # one event for all changes made in the same reactor iteration
+        if self.changes_timer is None:
+            self.changes_timer = reactor.callLater(0, self.emit_changes)
+
+    def emit_changes(self):
+        self.changes_timer = None
+        previous = self.changes_emitted
+        self.changes_emitted = self.changes.version
+        changes = self.changes.since(previous)
+        component.get("EventManager").emit(SeedTimeChangedEvent(previous, self.changes.version, changes))
+
+    def on_torrent_state_changed(self, torrent_id, state):
+        if state == "Seeding":
+            if torrent_id in self.torrent_stop_times and torrent_id not in self.scheduler:
+                self.schedule_torrent(torrent_id)
+                self.arm_deadline_timer()
+        else:
+            if torrent_id in self.scheduler:
+                self.unschedule_torrent(torrent_id)
+            self.stop_waiting(torrent_id)
+
+    def on_torrent_finished(self, torrent_id):
+        torrent = self.torrent_manager.torrents.get(torrent_id)
+        if torrent is not None:
+            self.on_torrent_state_changed(torrent_id, torrent.state)
 
     @export
     def set_config(self, config):
         """Sets the config dictionary"""
         log.debug('seedtime %r' % config)
+        # everything is checked before anything is changed, each raises
+        # ValueError for invalid values or backtracking prone patterns
+        filters = removal_policy = None
+        if [key for key in ("filter_list", "tracker_cache_size", "filter_time_budget") if key in config]:
+            filters = FilterEngine(config.get("filter_list", self.config["filter_list"]),
+                                   tracker_cache_size=config.get("tracker_cache_size",
+                                                                 self.config["tracker_cache_size"]),
+                                   time_budget=config.get("filter_time_budget",
+                                                          self.config["filter_time_budget"]) / 1000.0)
+        if "default_min_ratio" in config or "default_min_upload_rate" in config:
+            StopCondition(config.get("default_min_ratio", self.config["default_min_ratio"]),
+                          config.get("default_min_upload_rate", self.config["default_min_upload_rate"]))
+        removal_keys = ("removal_windows", "removal_max_upload_rate", "removal_max_disk_queue")
+        if [key for key in removal_keys if key in config]:
+            removal_config = dict((key, config.get(key, self.config[key])) for key in removal_keys)
+            removal_policy = self.get_removal_policy(removal_config)
+        if filters is not None:
+            self.filters = filters
+            self.stats.rule_hits.clear()
+        if removal_policy is not None:
+            self.removal_policy = removal_policy
         log.debug('component state %r, component timer %r' % (self._component_state, self._component_timer))
         for key in config.keys():
             self.config[key] = config[key]
-        self.config.save()
+        if self.looping_call.running and self.looping_call.interval != self.config["reconcile_interval"]:
+            self.looping_call.stop()
+            self.looping_call.start(self.config["reconcile_interval"], now=False)
+        if self.looping_call.running and "snapshot_interval" in config:
+            if self.snapshot_call.running:
+                self.snapshot_call.stop()
+            if self.config["snapshot_interval"] > 0:
+                self.snapshot_call.start(self.config["snapshot_interval"], now=False)
+        if "rate_window" in config or "reconcile_interval" in config:
+            self.rate_windows.clear()  # sized for the old sample interval
+        self.saver.interval = self.config["save_interval"]
+        self.enforcer.max_per_second = self.config["max_actions_per_second"]
+        self.remover.max_per_second = self.config["max_actions_per_second"]
+        self.changes.resize(self.config["change_feed_size"])
+        self.worker.resize(self.config["worker_threads"])
+        self.worker.max_pending = self.config["worker_max_pending"]
+        self.save_config()
+        self.stats.enabled = self.config["collect_stats"]
+        if self.stats_call.running:
+            self.stats_call.stop()
+        if self.config["stats_log_interval"] > 0:
+            self.stats_call.start(self.config["stats_log_interval"], now=False)
 
     @export
     def get_config(self):
         """Returns the config dictionary"""
-        return self.config.config
+        return dict((key, self.config[key]) for key in CONFIG_DEFAULT)
+
+    @export
+    def get_stop_times(self, offset=0, limit=100, prefix="", after=None):
+        """Returns a page of the per-torrent stop times, ordered by torrent id.
+
+        Only torrent ids starting with prefix are included. The result is a
+        dict with the number of matching ids as "total" and the page as a
+        "stop_times" dict of torrent_id: stop_time (in days). Pass the "last"
+        torrent id of a page as after to get the next one, unlike an offset
+        that cursor does not shift when earlier ids are removed meanwhile.
+        """
+        total, page = self.torrent_stop_times.query(prefix, max(0, offset), max(0, limit), after)
+        return {"total": total, "offset": offset, "stop_times": dict(page),
+                "last": page[-1][0] if page else None, "version": self.changes.version}
+
+    @export
+    def get_changes(self, since_version):
+        """Returns the stop times that changed after since_version.
+
+        The result has the current "version" and the "changes" as a dict of
+        torrent_id: stop_time, where None means the stop time was removed. If
+        the changes are no longer all known "resync" is True instead, and the
+        client has to reload everything with get_stop_times.
+        """
+        changes = self.changes.since(since_version)
+        if changes is None:
+            return {"version": self.changes.version, "resync": True}
+        return {"version": self.changes.version, "changes": changes}
+
+    @export
+    def reapply_filters(self, scope=None, dry_run=False):
+        """Runs the filters over existing torrents in the background.
+
+        scope limits the torrents to a {"label": label} and/or a
+        {"tracker": regex} subset, None means all torrents. Torrents whose stop
+        time or StopCondition would change are updated and persisted once at the end, or with
+        dry_run only reported. Returns the final progress, which in dry run
+        mode includes the "stop_times" that would have been set.
+        """
+        if self.reapply_task is not None:
+            raise RuntimeError("reapply_filters is already running")
+        scope = scope or {}
+        if scope.get("tracker"):
+            re.compile(scope["tracker"])  # report invalid patterns to the caller
+        torrent_ids = list(self.torrent_manager.torrents)
+        progress = self.reapply_progress = {
+            "running": True,
+            "cancelled": False,
+            "dry_run": dry_run,
+            "scope": scope,
+            "total": len(torrent_ids),
+            "processed": 0,
+            "matched": 0,
+            "conditions_changed": 0,
+            "stop_times": {},
+        }
+        d = Deferred()
+        self.reapply_task = cooperate(self._reapply_filters(torrent_ids, scope, progress))
+        self.reapply_task.whenDone().addBoth(self._on_reapplied, progress, d)
+        return d
+
+    @export
+    def get_reapply_progress(self, include_stop_times=False):
+        """Returns the progress of the last reapply_filters run, or None."""
+        if self.reapply_progress is None:
+            return None
+        progress = dict(self.reapply_progress)
+        progress["changed"] = len(progress["stop_times"])
+        if not include_stop_times:
+            del progress["stop_times"]
+        return progress
+
+    @export
+    def cancel_reapply(self):
+        """Stops a running reapply_filters, keeping the changes made so far."""
+        if self.reapply_task is None:
+            return False
+        self.reapply_task.stop()
+        return True
+
+    @export
+    def compact(self):
+        """Removes the stop times of torrents that no longer exist.
+
+        Returns the number of stop times that were removed.
+        """
+        return self.prune_stop_times()
+
+    @export
+    def get_stats(self, reset=False):
+        """Returns timings and counters of the plugin's hot paths.
+
+        If reset is True the collected stats are cleared after reading them.
+        """
+        stats = self.stats.to_dict()
+        stats["rules"] = [dict(rule, hits=self.stats.rule_hits.get(index, 0))
+                          for index, rule in enumerate(self.config["filter_list"])]
+        for index, (max_time, overruns, over_budget) in self.filters.get_rule_costs().iteritems():
+            stats["rules"][index]["max_time_ms"] = max_time * 1000.0
+            stats["rules"][index]["overruns"] = overruns
+            stats["rules"][index]["over_budget"] = over_budget
+        stats["persistence"] = self.saver.get_counters()
+        stats["tracker_cache"] = self.filters.get_cache_stats()
+        stats["scheduled"] = len(self.scheduler)
+        stats["enforcement_queue"] = len(self.enforcer)
+        stats["enforced"] = self.enforcer.processed
+        stats["waiting_for_condition"] = len(self.waiting)
+        stats["rate_windows"] = len(self.rate_windows)
+        stats["status_buffer"] = self.status_buffer.get_counters()
+        stats["snapshot_size"] = self.snapshot_size
+        stats["pending_removals"] = len(self.pending_removals)
+        stats["removal_queue"] = len(self.remover)
+        stats["worker"] = self.worker.get_counters()
+        if reset:
+            self.stats.reset()
+        return stats
 
     @export
     def set_torrent(self, torrent_id , stop_time):
+        self.update_stop_time(torrent_id, stop_time)
+        self.saver.mark_dirty()
+        self.arm_deadline_timer()
+
+    @export
+    def set_torrents(self, torrent_ids, stop_time):
+        """Sets the stop time of several torrents at once.
+
+        Returns a dict of torrent_id: error for the ids that were not changed.
+        """
+        errors = {}
+        torrents = self.torrent_manager.torrents
+        known = []
+        for torrent_id in torrent_ids:
+            if torrent_id not in torrents:
+                errors[torrent_id] = "unknown torrent"
+                continue
+            known.append(torrent_id)
+        # the seeding times of all the seeding torrents in one status fetch
+        status = self.fetch_status([torrent_id for torrent_id in known if torrents[torrent_id].state == "Seeding"])
+        for torrent_id in known:
+            self.update_stop_time(torrent_id, stop_time, status.get_seeding_time(torrent_id))
+        if known:
+            self.saver.mark_dirty()
+            self.arm_deadline_timer()
+        return errors
+
+    @export
+    def set_torrent_condition(self, torrent_ids, min_ratio=0, min_upload_rate=0):
+        """Sets what the torrents have to reach past their stop time before they stop.
+
+        Torrents stop once their ratio reaches min_ratio or their average upload
+        rate over the rate window drops below min_upload_rate (in KiB/s), 0 for
+        both stops them at their stop time. Returns a dict of torrent_id: error
+        for the ids that were not changed.
+        """
+        condition = StopCondition.from_dict({"min_ratio": min_ratio, "min_upload_rate": min_upload_rate})
+        errors = {}
+        changed = False
+        torrents = self.torrent_manager.torrents
+        for torrent_id in torrent_ids:
+            if torrent_id not in torrents:
+                errors[torrent_id] = "unknown torrent"
+                continue
+            if self.update_condition(torrent_id, condition):
+                # the deadline does not depend on the condition, only the
+                # torrents already past it are affected
+                if torrent_id in self.waiting:
+                    self.rate_windows.pop(torrent_id, None)
+                    if condition is None:
+                        self.stop_waiting(torrent_id)
+                        self.enforcer.push(torrent_id)
+                changed = True
+        if changed:
+            self.saver.mark_dirty()
+        return errors
+
+    @export
+    def get_torrent_condition(self, torrent_id):
+        """Returns the min_ratio and min_upload_rate of the torrent, or None."""
+        condition = self.get_condition(torrent_id)
+        if condition is None:
+            return None
+        return condition.to_dict()
+
+    def update_stop_time(self, torrent_id, stop_time, seeding_time=None):
         if stop_time is None or stop_time < 0:
-            del self.torrent_stop_times[torrent_id]
-        else:
+            if self.torrent_stop_times.pop(torrent_id, None) is not None:
+                self.changes.record(torrent_id, None)
+        elif self.torrent_stop_times.get(torrent_id) != stop_time:
             self.torrent_stop_times[torrent_id] = stop_time
-        self.config.save()
+            self.changes.record(torrent_id, self.torrent_stop_times[torrent_id])
+        self.discard_pending_removal(torrent_id)
+        self.schedule_torrent(torrent_id, seeding_time)
 
     def _status_get_seed_stop_time(self, torrent_id):
         """Returns the stop seed time for the torrent."""
         return self.torrent_stop_times.get(torrent_id, 0) * 3600.0 * 24.0
 
     def _status_get_remaining_seed_time(self, torrent_id):
-        """Returns the stop seed time for the torrent."""
-        stop_time = self._status_get_seed_stop_time(torrent_id)
-        torrent = component.get("TorrentManager")[torrent_id]
-        seed_time = torrent.get_status(['seeding_time'])['seeding_time']
-        return max(0, stop_time-seed_time)
+        """Returns the remaining seed time for the torrent."""
+        stop_time = self.torrent_stop_times.get(torrent_id)
+        if stop_time is None:
+            return 0
+        deadline = self.scheduler.get(torrent_id)
+        if deadline is not None:
+            return max(0, deadline - time.time())
+        seeding_time = self.seeding_times.get(torrent_id)
+        if seeding_time is None:
+            if torrent_id not in self.torrent_manager.torrents:
+                return 0
+            # a torrent list refresh asks for all torrents, read them all at once
+            self.fill_seeding_times()
+            seeding_time = self.seeding_times.get(torrent_id, 0)
+        return max(0, stop_time * 3600.0 * 24.0 - seeding_time)
+
+    def fill_seeding_times(self):
+        """Cache the seeding time of every unscheduled torrent with a stop time."""
+        torrents = self.torrent_manager.torrents
+        missing = [torrent_id for torrent_id in self.torrent_stop_times
+                   if torrent_id not in self.seeding_times and torrent_id not in self.scheduler
+                   and torrent_id in torrents]
+        status = self.fetch_status(missing)
+        for torrent_id in missing:
+            seeding_time = status.get_seeding_time(torrent_id)
+            if seeding_time is not None:
+                self.seeding_times[torrent_id] = seeding_time
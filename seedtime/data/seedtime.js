@@ -49,6 +49,7 @@ Deluge.ux.preferences.SeedTimePage = Ext.extend(Ext.Panel, {
         align: 'stretch'
     },
     hasReadConfig : false,
+    unapplied : false,
 
     initComponent: function() {
         Deluge.ux.preferences.SeedTimePage.superclass.initComponent.call(this);
@@ -129,6 +130,8 @@ Deluge.ux.preferences.SeedTimePage = Ext.extend(Ext.Panel, {
               {name : 'field', type : 'string'},
               {name : 'filter', type : 'string'},
               {name : 'stop_time', type : 'float'},
+              {name : 'min_ratio', type : 'float'},
+              {name : 'min_upload_rate', type : 'float'},
             ],
             id : 0
           }),
@@ -137,24 +140,36 @@ Deluge.ux.preferences.SeedTimePage = Ext.extend(Ext.Panel, {
             columns : [
               {
                 header : 'Field',
-                width : .24,
+                width : .16,
                 sortable : false,
                 dataIndex : 'field',
                 editor : combo,
                 renderer : Ext.util.Format.comboRenderer(combo),
               },
               { header : 'Filter',
-                width : .50,
+                width : .36,
                 dataIndex : 'filter',
                 editor : {xtype : 'textfield' },
               },
               { header : 'Stop Seed Time (days)',
-                width : .26,
+                width : .18,
                 editor : { xtype : 'numberfield',
                            maxValue : 365.0,
                            minValue : 0.01 },
                 dataIndex : 'stop_time'
               },
+              { header : 'Min Ratio',
+                width : .14,
+                editor : { xtype : 'numberfield',
+                           minValue : 0 },
+                dataIndex : 'min_ratio'
+              },
+              { header : 'Min Upload (KiB/s)',
+                width : .16,
+                editor : { xtype : 'numberfield',
+                           minValue : 0 },
+                dataIndex : 'min_upload_rate'
+              },
             ]
           }),
           viewConfig : {forceFit : true},
@@ -201,7 +216,7 @@ Deluge.ux.preferences.SeedTimePage = Ext.extend(Ext.Panel, {
 
     filterAdd: function() {
         var store = this.filter_list.getStore();
-        store.insert(0, new store.recordType({ field : "label", filter : "RegEx", stop_time : 3.0}));
+        store.insert(0, new store.recordType({ field : "label", filter : "RegEx", stop_time : 3.0, min_ratio : 0, min_upload_rate : 0}));
     },
 
     filterRemove: function() {
@@ -229,7 +244,17 @@ Deluge.ux.preferences.SeedTimePage = Ext.extend(Ext.Panel, {
             config['filter_list'] = filter_items;
             config['delay_time'] = this.delayTime.getValue();
             config['default_stop_time'] = this.defaultStoptime.getValue();
-            deluge.client.seedtime.set_config(config);
+            deluge.client.seedtime.set_config(config, {
+                success: function() {
+                    this.unapplied = false;
+                },
+                failure: function(error) {
+                    // keep the rejected settings on the page so they can be corrected
+                    this.unapplied = true;
+                    Ext.Msg.alert('SeedTime', 'The settings were not saved: ' + error.message);
+                },
+                scope: this
+            });
         }
     },
 
@@ -238,6 +263,7 @@ Deluge.ux.preferences.SeedTimePage = Ext.extend(Ext.Panel, {
     },
 
     updateConfig: function() {
+        if (this.unapplied) return;
         deluge.client.seedtime.get_config({
             success: function(config) {
                 this.removeWhenStopped.setValue(config['remove_torrent']);
@@ -313,6 +339,13 @@ SeedTimePlugin = Ext.extend(Deluge.Plugin, {
 
     name: 'SeedTime',
 
+    // stop times are loaded once and then kept up to date from SeedTimeChangedEvent,
+    // the change feed is also polled in case an event was missed
+    stopTimes: {},
+    stopTimesVersion: null,
+    stopTimesPageSize: 5000,
+    changeFeedInterval: 60000,
+
     createMenu: function() {
         menuTimes = [1, 2, 3, 7, 14, 30],
         itemslist = [{  text: _('Never'),
@@ -337,23 +370,82 @@ SeedTimePlugin = Ext.extend(Deluge.Plugin, {
 
     setStoptime: function(item, e) {
         var ids = deluge.torrents.getSelectedIds();
-        Ext.each(ids, function(id, i) {
-            if (ids.length == i + 1) {
-                deluge.client.seedtime.set_torrent(id, item.stop_time, {
-                    success: function() {
-                        deluge.ui.update();
-                    }
-                });
+        deluge.client.seedtime.set_torrents(ids, item.stop_time, {
+            success: function() {
+                this.updateStopTimes();
+                deluge.ui.update();
+            },
+            scope: this
+        });
+    },
+
+    loadStopTimes: function(after, stopTimes, version) {
+        // paged by the last torrent id, removals between pages do not shift them
+        deluge.client.seedtime.get_stop_times(0, this.stopTimesPageSize, '', after, {
+            success: function(result) {
+                Ext.apply(stopTimes, result.stop_times);
+                // changes made while paging are picked up from the first page's version
+                if (version == null) version = result.version;
+                if (result.last != null) {
+                    this.loadStopTimes(result.last, stopTimes, version);
+                } else {
+                    this.stopTimes = stopTimes;
+                    this.stopTimesVersion = version;
+                    this.updateStopTimes();
+                }
+            },
+            scope: this
+        });
+    },
+
+    updateStopTimes: function() {
+        if (this.stopTimesVersion == null) return;
+        deluge.client.seedtime.get_changes(this.stopTimesVersion, {
+            success: function(result) {
+                if (result.resync) {
+                    this.stopTimesVersion = null;
+                    this.loadStopTimes(null, {}, null);
+                    return;
+                }
+                this.applyStopTimeChanges(result.changes, result.version);
+            },
+            scope: this
+        });
+    },
+
+    applyStopTimeChanges: function(changes, version) {
+        for (var id in changes) {
+            if (changes[id] == null) {
+                delete this.stopTimes[id];
             } else {
-                deluge.client.seedtime.set_torrent(id, item.stop_time);
+                this.stopTimes[id] = changes[id];
             }
-        });
+        }
+        if (this.stopTimesVersion != version) {
+            this.stopTimesVersion = version;
+            deluge.torrents.getView().refresh();
+        }
+    },
+
+    onStopTimesChanged: function(previousVersion, version, changes) {
+        if (this.stopTimesVersion == null) return;
+        if (changes == null || previousVersion != this.stopTimesVersion) {
+            // missed some changes, fetch everything since our version
+            this.updateStopTimes();
+        } else {
+            this.applyStopTimeChanges(changes, version);
+        }
+    },
+
+    getStopTime: function(record) {
+        var stopTime = this.stopTimes[record.id];
+        return stopTime == null ? null : stopTime * 3600 * 24;
     },
 
     setCustomStoptime: function(item, e) {
         if (!this.customTimeWindow) {
             this.customTimeWindow = new Deluge.ux.CustomSeedtimeWindow();
-            this.customTimeWindow.setStoptime = this.setStoptime;
+            this.customTimeWindow.setStoptime = this.setStoptime.createDelegate(this);
         }
         this.customTimeWindow.item = item;
         this.customTimeWindow.e = e;
@@ -364,9 +456,13 @@ SeedTimePlugin = Ext.extend(Deluge.Plugin, {
         deluge.preferences.removePage(this.prefsPage);
         deluge.menus.torrent.remove(this.tmSep);
         deluge.menus.torrent.remove(this.tm);
+        Ext.TaskMgr.stop(this.changeFeedTask);
+        deluge.events.un('SeedTimeChangedEvent', this.onStopTimesChanged, this);
         this.deregisterTorrentStatus('seeding_time');
         this.deregisterTorrentStatus('seed_stop_time');
         this.deregisterTorrentStatus('seed_time_remaining');
+        this.stopTimes = {};
+        this.stopTimesVersion = null;
     },
 
     onEnable: function() {
@@ -391,10 +487,30 @@ SeedTimePlugin = Ext.extend(Deluge.Plugin, {
         // status columns
         this.registerTorrentStatus('seeding_time', _('Seed Time'),
             { colCfg : { sortable : true, renderer : ftimewithnull}});
+        // stop and remaining time are computed here from the cached stop times
+        // and seeding_time, so they are not requested from the server
+        var plugin = this;
         this.registerTorrentStatus('seed_stop_time', _('Stop Seed Time'),
-            { colCfg : { sortable : true, renderer : ftimewithnull}});
+            { colCfg : { sortable : false, renderer : function(value, meta, record) {
+                return ftimewithnull(plugin.getStopTime(record));
+            }}});
         this.registerTorrentStatus('seed_time_remaining', _('Remaining Seed Time'),
-            { colCfg : { sortable : true, renderer : ftimewithnull}});
+            { colCfg : { sortable : false, renderer : function(value, meta, record) {
+                var stopTime = plugin.getStopTime(record);
+                if (stopTime == null) return "";
+                return ftimewithnull(Math.max(0, stopTime - record.get('seeding_time')));
+            }}});
+        Deluge.Keys.Grid.remove('seed_stop_time');
+        Deluge.Keys.Grid.remove('seed_time_remaining');
+
+        deluge.events.on('SeedTimeChangedEvent', this.onStopTimesChanged, this);
+        this.loadStopTimes(null, {}, null);
+        this.changeFeedTask = {
+            run: this.updateStopTimes,
+            scope: this,
+            interval: this.changeFeedInterval
+        };
+        Ext.TaskMgr.start(this.changeFeedTask);
     }
 });
 Deluge.registerPlugin('SeedTime', SeedTimePlugin);
@@ -0,0 +1,110 @@
+#
+# enforcer.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+from collections import deque
+from twisted.internet import reactor
+from deluge.log import LOG as log
+
+UNLIMITED_CHUNK = 50  # actions per reactor iteration when there is no rate limit
+
+
+class EnforcementQueue(object):
+    """Runs the stop actions for expired torrents in rate limited chunks.
+
+    Between chunks control goes back to the reactor so RPC clients are still
+    served while a large backlog of pauses or removals is worked off.
+    """
+
+    def __init__(self, action, max_per_second, chunk_interval=0.5):
+        self.action = action
+        self.max_per_second = max_per_second
+        self.chunk_interval = chunk_interval
+        self.queue = deque()
+        self.queued = set()
+        self.timer = None
+        self.processed = 0
+
+    def __len__(self):
+        return len(self.queued)
+
+    def __contains__(self, torrent_id):
+        return torrent_id in self.queued
+
+    def push(self, torrent_id):
+        if torrent_id in self.queued:
+            return
+        self.queued.add(torrent_id)
+        self.queue.append(torrent_id)
+        if self.timer is None:
+            self.timer = reactor.callLater(0, self.run)
+
+    def discard(self, torrent_id):
+        # the stale queue entry is skipped when it comes up
+        self.queued.discard(torrent_id)
+
+    def stop(self):
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+        self.timer = None
+        self.queue.clear()
+        self.queued.clear()
+
+    def run(self):
+        self.timer = None
+        if self.max_per_second > 0:
+            chunk = max(1, int(self.max_per_second * self.chunk_interval))
+            delay = chunk / float(self.max_per_second)
+        else:
+            chunk, delay = UNLIMITED_CHUNK, 0
+
+        while chunk and self.queue:
+            torrent_id = self.queue.popleft()
+            if torrent_id not in self.queued:
+                continue
+            self.queued.discard(torrent_id)
+            chunk -= 1
+            self.processed += 1
+            try:
+                self.action(torrent_id)
+            except Exception, e:
+                log.error("seedtime unable to stop torrent %s: %s" % (torrent_id, e))
+
+        if self.queue:
+            log.debug("seedtime enforcement queue depth %d" % len(self.queued))
+            self.timer = reactor.callLater(delay, self.run)
@@ -0,0 +1,375 @@
+#
+# filters.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+import re
+import sre_constants
+import sre_parse
+import threading
+import time
+from collections import OrderedDict
+from deluge.log import LOG as log
+
+try:
+    import re2  # linear time matching, no backtracking
+except ImportError:
+    re2 = None
+
+from conditions import StopCondition
+
+FIELDS = ("label", "tracker", "default")
+REGEX_META = frozenset(".^$*+?{}[]\\|()")
+MAXREPEAT = getattr(sre_constants, "MAXREPEAT", getattr(sre_parse, "MAXREPEAT", 65535))
+REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+OVERRUN_LIMIT = 3  # consecutive searches over the time budget before a rule is skipped
+
+
+def _subpatterns(op, av):
+    """Yields the parsed subpatterns nested in one sre_parse item."""
+    if op in REPEATS:
+        yield av[2]
+    elif op == sre_constants.SUBPATTERN:
+        yield av[-1]
+    elif op == sre_constants.BRANCH:
+        for branch in av[1]:
+            yield branch
+    elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        yield av[1]
+    elif op == sre_constants.GROUPREF_EXISTS:
+        for branch in av[1:]:
+            if branch is not None:
+                yield branch
+
+
+def _has_variable_repeat(parsed):
+    for op, av in parsed:
+        if op in REPEATS and av[0] != av[1]:
+            return True
+        for sub in _subpatterns(op, av):
+            if _has_variable_repeat(sub):
+                return True
+    return False
+
+
+def _find_nested_repeat(parsed):
+    for op, av in parsed:
+        if op in REPEATS and av[1] >= MAXREPEAT:
+            body = av[2]
+            while len(body) == 1 and body[0][0] == sre_constants.SUBPATTERN:
+                body = body[0][1][-1]
+            # a literal in the body (as in "(\w+\.)+") splits the input
+            # between the iterations, without one the ways to split it
+            # grow exponentially with its length
+            delimited = [item for item in body if item[0] == sre_constants.LITERAL]
+            if not delimited and _has_variable_repeat(body):
+                return True
+        for sub in _subpatterns(op, av):
+            if _find_nested_repeat(sub):
+                return True
+    return False
+
+
+def check_pattern(pattern):
+    """Raises ValueError if the pattern is prone to catastrophic backtracking.
+
+    Only nested quantifiers such as "(a+)+" or "(.*,?)*" are detected, the
+    time budget of the FilterEngine catches whatever this misses.
+    """
+    if _find_nested_repeat(sre_parse.parse(pattern)):
+        raise ValueError("nested quantifiers may take exponential time, "
+                         "add a delimiter to the repeated group or simplify it")
+
+
+def compile_pattern(pattern):
+    """Returns (regex, linear), with re2 when it is installed and supports the pattern."""
+    if re2 is not None:
+        try:
+            return re2.compile(pattern), True
+        except Exception:  # not supported by re2, e.g. back references
+            pass
+    check_pattern(pattern)
+    return re.compile(pattern), False
+
+
+class FilterRule(object):
+    __slots__ = ("index", "position", "field", "pattern", "stop_time", "condition", "regex", "literal",
+                 "linear", "max_time", "overruns", "over_budget")
+
+    def __init__(self, index, field, pattern, stop_time, condition=None):
+        self.index = index
+        self.position = None  # index among the rules of the same field
+        self.field = field
+        self.pattern = pattern
+        self.stop_time = stop_time
+        self.condition = condition  # StopCondition of the matched torrents, or None
+        # patterns without any regex syntax are plain substring tests
+        if REGEX_META.isdisjoint(pattern):
+            self.regex = re.compile(pattern)
+            self.literal = pattern
+            self.linear = True
+        else:
+            self.regex, self.linear = compile_pattern(pattern)
+            self.literal = None
+        self.max_time = 0.0  # longest single search (in seconds)
+        self.overruns = 0  # consecutive searches over the time budget
+        self.over_budget = False  # skipped after OVERRUN_LIMIT overruns in a row
+
+    def matches(self, value):
+        if self.literal is not None:
+            return self.literal in value
+        return self.regex.search(value) is not None
+
+
+class FilterEngine(object):
+    """The compiled form of the filter_list config.
+
+    Rules keep their configured order and the first matching rule wins. The
+    values of a field are requested at most once per torrent, and each field
+    has a combined regex of all its rules so a torrent that cannot match any
+    of them is rejected with a single search.
+
+    Many torrents share the same tracker urls, so the first tracker rule
+    matching each url is remembered in a bounded LRU cache. A new engine is
+    compiled whenever the filter_list changes, which starts a fresh cache.
+    The cache is guarded by a lock, so match() may run on several threads.
+
+    Searches of backtracking regexes are timed. The wall clock time also
+    counts waiting for the GIL while matching on a worker thread, so a search
+    over time_budget seconds is measured again and a rule is only logged and
+    skipped from then on after OVERRUN_LIMIT such searches in a row.
+    """
+
+    def __init__(self, filter_list, strict=True, tracker_cache_size=4096, time_budget=0):
+        self.rules = []
+        self.invalid = []  # (index, pattern, error) of rules skipped when not strict
+        patterns = {}
+        for index, rule in enumerate(filter_list):
+            if rule.get('field') not in FIELDS:  # unknown filter, ignore
+                continue
+            try:
+                compiled = FilterRule(index, rule['field'], rule['filter'], rule['stop_time'],
+                                      StopCondition.from_dict(rule))
+            except (re.error, TypeError, ValueError), e:
+                if strict:
+                    raise ValueError("Invalid filter %r for %s: %s" % (rule['filter'], rule['field'], e))
+                self.invalid.append((index, rule['filter'], str(e)))
+                continue
+            self.rules.append(compiled)
+            field_patterns = patterns.setdefault(compiled.field, [])
+            compiled.position = len(field_patterns)
+            field_patterns.append(compiled.pattern)
+
+        self.prefilters = {}
+        self.linear_prefilters = set()  # fields whose prefilter cannot backtrack
+        for field, field_patterns in patterns.iteritems():
+            self.prefilters[field] = self._combine(field, field_patterns)
+
+        self.fields = frozenset(rule.field for rule in self.rules)
+        self.tracker_rules = [rule for rule in self.rules if rule.field == "tracker"]
+        self.tracker_cache = OrderedDict()  # url: position of the first matching tracker rule
+        self.tracker_cache_lock = threading.Lock()
+        self.tracker_cache_size = tracker_cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.time_budget = time_budget
+        self.prefilter_overruns = {}  # field: consecutive prefilter searches over the time budget
+
+    def _combine(self, field, field_patterns):
+        if len(field_patterns) < 2:
+            return None
+        for pattern in field_patterns:
+            # group references would point at the wrong group once combined
+            if re.search(r"\\\d|\(\?P=|\(\?\w*[iLmsux]", pattern):
+                return None
+        try:
+            regex, linear = compile_pattern("|".join("(?:%s)" % pattern for pattern in field_patterns))
+        except (re.error, ValueError):
+            return None
+        if linear or REGEX_META.isdisjoint("".join(field_patterns)):
+            self.linear_prefilters.add(field)
+        return regex
+
+    def prefilter_search(self, field, prefilter, value):
+        """Returns False if no rule of field can match value.
+
+        A prefilter that keeps going over the time budget is dropped, so the
+        rules are searched one by one and the slow one is found.
+        """
+        if not self.time_budget or field in self.linear_prefilters:
+            return prefilter.search(value) is not None
+        found, elapsed = self.timed_search(prefilter, value)
+        if elapsed <= self.time_budget:
+            self.prefilter_overruns[field] = 0
+            return found
+        overruns = self.prefilter_overruns[field] = self.prefilter_overruns.get(field, 0) + 1
+        if overruns >= OVERRUN_LIMIT:
+            log.warning("seedtime filters for %s took %.1fms on %r, searching them one by one"
+                        % (field, elapsed * 1000.0, value[:200]))
+            with self.tracker_cache_lock:
+                self.prefilters.pop(field, None)
+        return found
+
+    def timed_search(self, regex, value):
+        """Returns (found, seconds), measuring a search over the time budget twice."""
+        started = time.time()
+        found = regex.search(value) is not None
+        elapsed = time.time() - started
+        if elapsed > self.time_budget:
+            # another thread may have held the GIL, a real cost shows again
+            started = time.time()
+            regex.search(value)
+            elapsed = min(elapsed, time.time() - started)
+        return found, elapsed
+
+    def first_tracker_rule(self, url):
+        """Returns the position of the first tracker rule matching url.
+
+        If no tracker rule matches, the number of tracker rules is returned.
+        """
+        cache = self.tracker_cache
+        with self.tracker_cache_lock:
+            position = cache.pop(url, None)
+            if position is not None:
+                self.cache_hits += 1
+                cache[url] = position
+                return position
+            self.cache_misses += 1
+        position = len(self.tracker_rules)
+        prefilter = self.prefilters.get("tracker")
+        if prefilter is None or self.prefilter_search("tracker", prefilter, url):
+            for rule in self.tracker_rules:
+                if self.search(rule, url):
+                    position = rule.position
+                    break
+        with self.tracker_cache_lock:
+            cache[url] = position
+            if len(cache) > self.tracker_cache_size:
+                cache.popitem(last=False)
+        return position
+
+    def get_cache_stats(self):
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "size": len(self.tracker_cache),
+            "max_size": self.tracker_cache_size,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": float(self.cache_hits) / lookups if lookups else 0.0,
+        }
+
+    def match(self, get_values):
+        """Returns the first rule matching the torrent, or None.
+
+        get_values(field) must return the list of strings to search for that
+        field, or None if the field cannot be determined for the torrent.
+        """
+        field_values = {}
+        for rule in self.rules:
+            field = rule.field
+            if field in field_values:
+                values = field_values[field]
+            else:
+                values = get_values(field)
+                prefilter = self.prefilters.get(field)
+                if values and field == "tracker":
+                    values = min(self.first_tracker_rule(url) for url in values)
+                elif values and prefilter is not None:
+                    for value in values:
+                        if self.prefilter_search(field, prefilter, value):
+                            break
+                    else:
+                        values = None
+                field_values[field] = values
+            if field == "tracker":
+                # the first tracker rule matching any of the urls
+                if values == rule.position:
+                    return rule
+                continue
+            if not values:
+                continue
+            for value in values:
+                if self.search(rule, value):
+                    return rule
+        return None
+
+    def search(self, rule, value):
+        """rule.matches(value), timing the searches that may backtrack."""
+        if rule.linear or not self.time_budget:
+            return rule.matches(value)
+        if rule.over_budget:
+            return False
+        found, elapsed = self.timed_search(rule.regex, value)
+        rule.max_time = max(rule.max_time, elapsed)
+        if elapsed <= self.time_budget:
+            rule.overruns = 0
+            return found
+        rule.overruns += 1
+        log.warning("seedtime filter #%d %r took %.1fms on %r, over the %.1fms budget"
+                    % (rule.index, rule.pattern, elapsed * 1000.0, value[:200], self.time_budget * 1000.0))
+        if rule.overruns >= OVERRUN_LIMIT:
+            self.skip_rule(rule)
+        return found
+
+    def skip_rule(self, rule):
+        rule.over_budget = True
+        log.error("seedtime skipping filter #%d %r, %d searches in a row went over the %.1fms budget"
+                  % (rule.index, rule.pattern, rule.overruns, self.time_budget * 1000.0))
+        with self.tracker_cache_lock:
+            # the prefilter would still run the pattern, and cached
+            # tracker positions may point at the skipped rule
+            self.prefilters.pop(rule.field, None)
+            self.tracker_cache.clear()
+
+    def get_rule_costs(self):
+        """Returns {index: (longest search in seconds, overruns in a row, skipped)} of the backtracking rules."""
+        return dict((rule.index, (rule.max_time, rule.overruns, rule.over_budget))
+                    for rule in self.rules if not rule.linear)
+
+
+def classify(engine, batch):
+    """Matches (torrent_id, values) pairs, values maps each field to its strings.
+
+    Returns a list of (torrent_id, rule or None, seconds taken). Only the
+    engine is used, so this may run on a worker thread.
+    """
+    results = []
+    for torrent_id, values in batch:
+        started = time.time()
+        rule = engine.match(values.get)
+        results.append((torrent_id, rule, time.time() - started))
+    return results
@@ -0,0 +1,317 @@
+#
+# fleet.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+import json
+import optparse
+import sys
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, DeferredList, DeferredSemaphore, succeed
+from deluge.log import LOG as log
+import deluge.log
+from deluge.ui.client import DaemonSSLProxy
+
+from conditions import StopCondition
+from filters import FilterEngine
+
+DEFAULT_PORT = 58846
+DEFAULT_CONCURRENCY = 32  # daemons talked to at the same time
+DEFAULT_TIMEOUT = 30  # seconds one daemon may take to connect, log in and answer
+
+USAGE = """%prog [options] HOSTS_FILE COMMAND
+
+HOSTS_FILE lists one daemon per line as [user[:password]@]host[:port].
+
+commands:
+  push CONFIG_JSON  set the seedtime config keys in CONFIG_JSON (e.g. filter_list,
+                    default_stop_time) on every daemon and read them back
+  stats             print the get_stats of every daemon as JSON
+  summary           print the stop time and enforcement counts of every daemon"""
+
+
+def parse_host(line):
+    """Parses "[user[:password]@]host[:port]" into (host, port, username, password)."""
+    username = password = ""
+    if "@" in line:
+        credentials, line = line.rsplit("@", 1)
+        username, _, password = credentials.partition(":")
+    host, _, port = line.partition(":")
+    if not host:
+        raise ValueError("Invalid daemon %r" % line)
+    try:
+        port = int(port) if port else DEFAULT_PORT
+    except ValueError:
+        raise ValueError("Invalid port in %r" % line)
+    return host, port, username, password
+
+
+def read_hosts(filename):
+    daemons = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                daemons.append(Daemon(*parse_host(line)))
+    return daemons
+
+
+class Daemon(object):
+    """A deluge daemon and the logged in connection kept open to it.
+
+    The connection is made by the first call and reused by the following
+    ones, calls made while it is being set up wait for it.
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, username="", password=""):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.proxy = None
+        self.pending = None  # the DaemonSSLProxy being connected
+        self.waiters = []  # Deferreds waiting for the pending connection
+
+    @property
+    def name(self):
+        return "%s:%d" % (self.host, self.port)
+
+    def connect(self):
+        """Returns a Deferred firing with the logged in DaemonSSLProxy."""
+        if self.proxy is not None:
+            return succeed(self.proxy)
+        d = Deferred()
+        self.waiters.append(d)
+        if self.pending is None:
+            proxy = self.pending = DaemonSSLProxy()
+            proxy.set_disconnect_callback(self.on_disconnect)
+            connected = proxy.connect(self.host, self.port)
+            connected.addCallback(lambda result: proxy.authenticate(self.username, self.password))
+            connected.addCallbacks(self.on_login, self.on_connect_failed, callbackArgs=(proxy,),
+                                   errbackArgs=(proxy,))
+        return d
+
+    def on_login(self, result, proxy):
+        if proxy is not self.pending:  # given up on by disconnect()
+            proxy.disconnect()
+            return
+        log.debug("seedtime-fleet logged in to %s" % self.name)
+        self.proxy, self.pending = proxy, None
+        waiters, self.waiters = self.waiters, []
+        for d in waiters:
+            d.callback(proxy)
+
+    def on_connect_failed(self, failure, proxy):
+        if proxy is not self.pending:
+            return
+        log.debug("seedtime-fleet could not connect to %s: %s" % (self.name, failure.getErrorMessage()))
+        self.pending = None
+        waiters, self.waiters = self.waiters, []
+        for d in waiters:
+            d.errback(failure)
+
+    def on_disconnect(self):
+        self.proxy = None
+
+    def call(self, method, *args, **kwargs):
+        d = self.connect()
+        d.addCallback(lambda proxy: proxy.call(method, *args, **kwargs))
+        return d
+
+    def disconnect(self):
+        """Closes the connection, or gives up on the one being set up."""
+        proxy = self.proxy or self.pending
+        self.proxy = self.pending = None
+        self.waiters = []
+        if proxy is not None:
+            try:
+                proxy.disconnect()
+            except Exception, e:  # never got as far as connecting
+                log.debug("seedtime-fleet disconnecting from %s: %s" % (self.name, e))
+
+
+class Fleet(object):
+    """Runs the same seedtime calls on many daemons concurrently.
+
+    At most concurrency daemons are busy at a time, and a daemon that does
+    not answer within timeout seconds fails on its own without holding up
+    the others.
+    """
+
+    def __init__(self, daemons, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        self.daemons = daemons
+        self.semaphore = DeferredSemaphore(concurrency)
+        self.timeout = timeout
+
+    def run(self, job):
+        """Runs job(daemon) for every daemon, job returns a Deferred.
+
+        Returns a Deferred firing with a dict of daemon name: (success, result
+        or error message).
+        """
+        deferreds = [self.semaphore.run(self._run, job, daemon) for daemon in self.daemons]
+        d = DeferredList(deferreds, consumeErrors=True)
+        d.addCallback(self._collect)
+        return d
+
+    def _run(self, job, daemon):
+        d = job(daemon)
+        timer = reactor.callLater(self.timeout, d.cancel)
+        def done(result):
+            if timer.active():
+                timer.cancel()
+            else:  # timed out, do not reuse a connection that may be stuck
+                daemon.disconnect()
+            return result
+        return d.addBoth(done)
+
+    def _collect(self, results):
+        collected = {}
+        for daemon, (success, result) in zip(self.daemons, results):
+            if not success:
+                result = result.getErrorMessage() or result.type.__name__
+            collected[daemon.name] = (success, result)
+        return collected
+
+    def push_config(self, config):
+        """Sets the config keys on every daemon, then reads them back to confirm."""
+        def push(daemon):
+            d = daemon.call("seedtime.set_config", config)
+            d.addCallback(lambda result: daemon.call("seedtime.get_config"))
+            d.addCallback(self._check_config, config)
+            return d
+        return self.run(push)
+
+    def _check_config(self, current, config):
+        differing = sorted(key for key in config if current.get(key) != config[key])
+        if differing:
+            raise ValueError("config not applied: %s" % ", ".join(differing))
+        return "ok"
+
+    def get_stats(self):
+        return self.run(lambda daemon: daemon.call("seedtime.get_stats"))
+
+    def get_summaries(self):
+        def summarize(daemon):
+            summary = {}
+            d = daemon.call("seedtime.get_stop_times", 0, 0)
+            d.addCallback(lambda page: summary.update(stop_times=page["total"]))
+            d.addCallback(lambda result: daemon.call("seedtime.get_stats"))
+            d.addCallback(self._summarize_stats, summary)
+            return d
+        return self.run(summarize)
+
+    def _summarize_stats(self, stats, summary):
+        for key in ("scheduled", "waiting_for_condition", "enforcement_queue", "enforced", "pending_removals"):
+            summary[key] = stats.get(key)
+        return summary
+
+    def disconnect(self):
+        for daemon in self.daemons:
+            daemon.disconnect()
+
+
+def validate_config(config):
+    """Raises ValueError for settings the daemons would reject."""
+    if not isinstance(config, dict):
+        raise ValueError("the config must be a JSON object")
+    if "filter_list" in config:
+        FilterEngine(config["filter_list"])
+    StopCondition(config.get("default_min_ratio", 0), config.get("default_min_upload_rate", 0))
+
+
+def print_results(results, command):
+    if command == "stats":
+        print json.dumps(dict((name, result) for name, (success, result) in results.iteritems()),
+                         indent=2, sort_keys=True)
+        return
+    for name, (success, result) in sorted(results.iteritems()):
+        if not success:
+            print "%-30s error: %s" % (name, result)
+        elif command == "summary":
+            print "%-30s %s" % (name, " ".join("%s=%s" % item for item in sorted(result.iteritems())))
+        else:
+            print "%-30s %s" % (name, result)
+
+
+def main(args=None):
+    parser = optparse.OptionParser(usage=USAGE)
+    parser.add_option("-c", "--concurrency", type="int", default=DEFAULT_CONCURRENCY,
+                      help="daemons to talk to at the same time [default: %default]")
+    parser.add_option("-t", "--timeout", type="float", default=DEFAULT_TIMEOUT,
+                      help="seconds to wait for each daemon [default: %default]")
+    parser.add_option("-L", "--loglevel", default="error", help="deluge log level [default: %default]")
+    options, args = parser.parse_args(args)
+    if len(args) < 2 or args[1] not in ("push", "stats", "summary") or (args[1] == "push") != (len(args) == 3):
+        parser.error("expected HOSTS_FILE and a command")
+    hosts_file, command = args[0], args[1]
+    deluge.log.setupLogger(options.loglevel)
+
+    try:
+        fleet = Fleet(read_hosts(hosts_file), max(1, options.concurrency), options.timeout)
+    except (IOError, ValueError), e:
+        parser.error(str(e))
+    if command == "push":
+        try:
+            with open(args[2]) as f:
+                config = json.load(f)
+            validate_config(config)
+        except (IOError, ValueError), e:
+            parser.error("%s: %s" % (args[2], e))
+        d = fleet.push_config(config)
+    elif command == "stats":
+        d = fleet.get_stats()
+    else:
+        d = fleet.get_summaries()
+
+    failed = []
+    def done(results):
+        print_results(results, command)
+        failed.extend(name for name, (success, result) in results.iteritems() if not success)
+    def stop(result):
+        fleet.disconnect()
+        reactor.callLater(0, reactor.stop)
+        return result
+    d.addCallback(done)
+    d.addErrback(lambda failure: failed.append(failure.getErrorMessage()))
+    d.addBoth(stop)
+    reactor.run()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -52,13 +52,22 @@ except ImportError:
 from common import get_resource
 
 
+def load_glade(root):
+    """Builds only the widget tree under root from config.glade."""
+    return gtk.glade.XML(get_resource("config.glade"), root)
+
+
 class GtkUI(GtkPluginBase):
     def enable(self):
-        self.glade = gtk.glade.XML(get_resource("config.glade"))
+        self.glade = load_glade("prefs_box")
+        self.treeview = None  # the filter table is built the first time the preferences are shown
+        self.liststore = None
+        self.unapplied = False  # the shown settings were rejected by the daemon, keep them for fixing
 
         component.get("Preferences").add_page("SeedTime", self.glade.get_widget("prefs_box"))
         component.get("PluginManager").register_hook("on_apply_prefs", self.on_apply_prefs)
         component.get("PluginManager").register_hook("on_show_prefs", self.on_show_prefs)
+        client.register_event_handler("SeedTimeChangedEvent", self.on_stop_times_changed)
         # Columns
         torrentview = component.get("TorrentView")
         torrentview.add_func_column(_("Seed Time"), cell_data_time, [int], status_field=["seeding_time"])
@@ -71,9 +80,6 @@ class GtkUI(GtkPluginBase):
         torrentmenu.append(self.seedtime_menu)
         self.seedtime_menu.show_all()
 
-        # Build Preference filter table
-        self.setupFilterTable()
-
     def setupFilterTable(self):
         # Setup filter button callbacks
         self.btnAdd = self.glade.get_widget("btnAdd")
@@ -139,6 +145,25 @@ class GtkUI(GtkPluginBase):
                                 "before being stopped. Default value is editable")
         self.treeview.append_column(column)
 
+        # setup min ratio and min upload rate columns
+        for index, title, tip, upper in (
+                (3, "Min Ratio", "Once seeded for the stop time, also stop "
+                                 "when this share ratio is reached. 0 to disable", 100),
+                (4, "Min Upload (KiB/s)", "Once seeded for the stop time, also stop when the "
+                                          "average upload rate drops below this. 0 to disable", 100000)):
+            renderer = gtk.CellRendererSpin()
+            renderer.connect("edited", self.on_condition_edited, index)
+            renderer.set_property("editable", True)
+            renderer.set_property("digits", 2)
+            renderer.set_property("adjustment", gtk.Adjustment(0, 0, upper, 0.1, 1, 0))
+            column = gtk.TreeViewColumn(title, renderer, text=index)
+            label = gtk.Label(title)
+            column.set_widget(label)
+            label.show()
+            tooltips = Tooltips()
+            tooltips.set_tip(label, tip)
+            self.treeview.append_column(column)
+
         self.sw1 = self.glade.get_widget('scrolledwindow1')
         self.sw1.add(self.treeview)
         self.sw1.show_all()
@@ -147,6 +172,7 @@ class GtkUI(GtkPluginBase):
         component.get("Preferences").remove_page("SeedTime")
         component.get("PluginManager").deregister_hook("on_apply_prefs", self.on_apply_prefs)
         component.get("PluginManager").deregister_hook("on_show_prefs", self.on_show_prefs)
+        client.deregister_event_handler("SeedTimeChangedEvent", self.on_stop_times_changed)
         try:
             # Columns
             component.get("TorrentView").remove_column(_("Seed Time"))
@@ -155,21 +181,63 @@ class GtkUI(GtkPluginBase):
             # Submenu
             torrentmenu = component.get("MenuBar").torrentmenu
             torrentmenu.remove(self.seedtime_menu)
+            self.seedtime_menu.destroy_dialog()
         except Exception, e:
             log.debug(e)
 
+    def on_stop_times_changed(self, previous_version, version, changes):
+        """Refresh the changed rows now instead of on the next status poll."""
+        torrentview = component.get("TorrentView")
+        if changes is None:
+            torrentview.mark_dirty()
+        elif changes:
+            # mark_dirty(torrent_id) walks the whole liststore, walk it once
+            # for all the changed ids instead
+            try:
+                id_column = torrentview.columns["torrent_id"].column_indices[0]
+                dirty_column = torrentview.columns["dirty"].column_indices[0]
+            except (AttributeError, KeyError, IndexError):
+                torrentview.mark_dirty()
+            else:
+                changed = set(changes)
+                for row in torrentview.liststore:
+                    if row[id_column] in changed:
+                        row[dirty_column] = True
+        torrentview.update()
+
     def on_apply_prefs(self):
         log.debug("applying prefs for SeedTime")
+        if self.liststore is None:  # the settings were never loaded
+            return
 
         config = {
             "remove_torrent": self.glade.get_widget("chk_remove_torrent").get_active(),
-            "filter_list": list({'field': row[0], 'filter': row[1], 'stop_time': row[2]} for row in self.liststore),
+            "filter_list": list({'field': row[0], 'filter': row[1], 'stop_time': row[2],
+                                 'min_ratio': row[3], 'min_upload_rate': row[4]} for row in self.liststore),
             "delay_time": self.glade.get_widget("delay_time").get_value_as_int(),
             "default_stop_time": self.glade.get_widget("default_stop_time").get_value(),
         }
-        client.seedtime.set_config(config)
+        client.seedtime.set_config(config).addCallbacks(self.on_config_applied, self.on_config_rejected)
+
+    def on_config_applied(self, result):
+        self.unapplied = False
+
+    def on_config_rejected(self, failure):
+        """Shows why set_config failed and reopens the page with the settings as entered."""
+        self.unapplied = True
+        message = failure.getErrorMessage()
+        log.error("seedtime settings rejected: %s" % message)
+        dialog = gtk.MessageDialog(None, gtk.DIALOG_MODAL, gtk.MESSAGE_ERROR, gtk.BUTTONS_CLOSE,
+                                   "The SeedTime settings were not saved:\n%s" % message)
+        dialog.run()
+        dialog.destroy()
+        component.get("Preferences").show("SeedTime")
 
     def on_show_prefs(self):
+        if self.treeview is None:
+            self.setupFilterTable()
+        if self.unapplied:  # keep the rejected settings so they can be corrected
+            return
         client.seedtime.get_config().addCallback(self.cb_get_config)
 
     def cb_get_config(self, config):
@@ -180,9 +248,10 @@ class GtkUI(GtkPluginBase):
         self.glade.get_widget("default_stop_time").set_value(config["default_stop_time"])
 
         # populate filter table
-        self.liststore = gtk.ListStore(str, str, float)
+        self.liststore = gtk.ListStore(str, str, float, float, float)
         for filter_ref in config['filter_list']:
-            self.liststore.append([filter_ref['field'], filter_ref['filter'], filter_ref['stop_time']])
+            self.liststore.append([filter_ref['field'], filter_ref['filter'], filter_ref['stop_time'],
+                                   filter_ref.get('min_ratio', 0), filter_ref.get('min_upload_rate', 0)])
 
         self.treeview.set_model(self.liststore)
 
@@ -195,8 +264,11 @@ class GtkUI(GtkPluginBase):
     def on_stoptime_edited(self, widget, path, value):
         self.liststore[path][2] = float(value)
 
+    def on_condition_edited(self, widget, path, value, index):
+        self.liststore[path][index] = max(0.0, float(value))
+
     def btnAddCallback(self, widget):
-        self.liststore.prepend(["label", "RegEx", 3.0])
+        self.liststore.prepend(["label", "RegEx", 3.0, 0.0, 0.0])
 
     def btnRemoveCallback(self, widget):
         selection = self.treeview.get_selection()
@@ -234,6 +306,7 @@ class SeedTimeMenu(gtk.MenuItem):
         self.sub_menu = gtk.Menu()
         self.set_submenu(self.sub_menu)
         self.items = []
+        self.custom_glade = None  # the custom time dialog, built on first use and reused
 
         #attach..
         torrentmenu = component.get("MenuBar").torrentmenu
@@ -263,18 +336,24 @@ class SeedTimeMenu(gtk.MenuItem):
 
     def on_select_time(self, widget=None, time=None):
         log.debug("select seed stop time:%s,%s" % (time ,self.get_torrent_ids()) )
-        for torrent_id in self.get_torrent_ids():
-            client.seedtime.set_torrent(torrent_id, time)
+        client.seedtime.set_torrents(self.get_torrent_ids(), time)
 
     def on_custom_time(self, widget=None):
         # Show the custom time dialog
-        glade = gtk.glade.XML(get_resource("config.glade"))
+        if self.custom_glade is None:
+            self.custom_glade = load_glade("dlg_custom_time")
+        glade = self.custom_glade
         dlg = glade.get_widget('dlg_custom_time')
         result = dlg.run()
+        dlg.hide()
         if result == gtk.RESPONSE_OK:
             time = glade.get_widget('txt_custom_stop_time').get_text()
             try:
                 self.on_select_time(time=float(time))
             except ValueError:
                 log.error('Invalid custom stop time entered.')
-        dlg.destroy()
+
+    def destroy_dialog(self):
+        if self.custom_glade is not None:
+            self.custom_glade.get_widget('dlg_custom_time').destroy()
+            self.custom_glade = None
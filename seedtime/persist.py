@@ -0,0 +1,142 @@
+#
+# persist.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+import errno
+import os
+import time
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from deluge.log import LOG as log
+
+
+def replace_file(tmp_filename, filename):
+    """Moves tmp_filename over filename.
+
+    Windows will not rename over an existing file, only then the target is
+    removed first. Any other failure is raised and leaves filename alone.
+    """
+    try:
+        os.rename(tmp_filename, filename)
+    except OSError, e:
+        if e.errno != errno.EEXIST or not os.path.exists(tmp_filename):
+            raise
+        os.remove(filename)
+        os.rename(tmp_filename, filename)
+
+
+class DebouncedSaver(object):
+    """Coalesces save requests so that save() runs at most once per interval.
+
+    save() may return a Deferred, no other save starts until it fires.
+    """
+
+    def __init__(self, save, interval):
+        self.save = save
+        self.interval = interval
+        self.timer = None
+        self.saving = False
+        self.flush_again = False
+        self.last_flush = 0
+        self.pending_writes = 0
+        self.flushes = 0
+        self.last_flush_time = 0.0
+        self.max_flush_time = 0.0
+        self.total_flush_time = 0.0
+
+    def mark_dirty(self):
+        self.pending_writes += 1
+        self._schedule()
+
+    def _schedule(self):
+        if self.timer is None or not self.timer.active():
+            delay = max(0, self.last_flush + self.interval - time.time())
+            self.timer = reactor.callLater(delay, self.flush)
+
+    def flush(self, force=False):
+        """Saves now. force starts a save even if the last one has not finished."""
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+        self.timer = None
+        if not self.pending_writes:
+            return
+        if self.saving and not force:
+            self.flush_again = True
+            return
+        self.flush_again = False
+        start = time.time()
+        pending, self.pending_writes = self.pending_writes, 0
+        try:
+            result = self.save()
+        except:
+            self.pending_writes += pending
+            raise
+        if isinstance(result, Deferred):
+            self.saving = True
+            result.addCallbacks(self._on_saved, self._on_save_failed, callbackArgs=(start,),
+                                errbackArgs=(pending,))
+        else:
+            self._on_saved(None, start)
+
+    def _on_save_failed(self, failure, pending):
+        log.error("seedtime saving failed: %s" % failure.getErrorMessage())
+        self.saving = False
+        self.pending_writes += pending
+        self._schedule()
+
+    def _on_saved(self, result, start):
+        self.saving = False
+        self.last_flush = time.time()
+        elapsed = self.last_flush - start
+        self.flushes += 1
+        self.last_flush_time = elapsed
+        self.max_flush_time = max(self.max_flush_time, elapsed)
+        self.total_flush_time += elapsed
+        if self.flush_again:
+            # after last_flush, so the next save waits a full interval
+            self.flush_again = False
+            self._schedule()
+
+    def get_counters(self):
+        return {
+            "pending_writes": self.pending_writes,
+            "flushes": self.flushes,
+            "last_flush_time": self.last_flush_time,
+            "max_flush_time": self.max_flush_time,
+            "total_flush_time": self.total_flush_time,
+        }
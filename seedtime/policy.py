@@ -0,0 +1,105 @@
+#
+# policy.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+import re
+import time
+
+WINDOW_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+
+
+def parse_window(window):
+    """Parses "HH:MM-HH:MM" into (start, end) minutes after midnight.
+
+    The end may be before the start for windows that span midnight.
+    """
+    match = WINDOW_RE.match(window)
+    if match is None:
+        raise ValueError("Invalid time window %r, expected HH:MM-HH:MM" % window)
+    start_hour, start_minute, end_hour, end_minute = [int(part) for part in match.groups()]
+    if start_hour > 23 or end_hour > 24 or start_minute > 59 or end_minute > 59:
+        raise ValueError("Invalid time window %r" % window)
+    return start_hour * 60 + start_minute, end_hour * 60 + end_minute
+
+
+class RemovalPolicy(object):
+    """Decides whether torrents may be removed right now.
+
+    Removals can be limited to maintenance windows (local time) and held
+    back while the session uploads faster than max_upload_rate (KiB/s) or
+    more than max_disk_queue disk writes are queued, 0 disables a limit.
+    """
+
+    def __init__(self, windows=(), max_upload_rate=0, max_disk_queue=0):
+        self.windows = [parse_window(window) for window in windows]
+        self.max_upload_rate = max_upload_rate
+        self.max_disk_queue = max_disk_queue
+
+    @property
+    def needs_session_status(self):
+        return self.max_upload_rate > 0 or self.max_disk_queue > 0
+
+    @property
+    def unrestricted(self):
+        return not self.windows and not self.needs_session_status
+
+    def in_window(self, now=None):
+        if not self.windows:
+            return True
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end in self.windows:
+            if start <= end:
+                if start <= minute < end:
+                    return True
+            elif minute >= start or minute < end:
+                return True
+        return False
+
+    def check(self, session_status=None, now=None):
+        """Returns None if removals may run, otherwise the reason they may not."""
+        if not self.in_window(now):
+            return "outside removal window"
+        if session_status is not None:
+            upload_rate = getattr(session_status, "upload_rate", 0) / 1024.0
+            if self.max_upload_rate > 0 and upload_rate > self.max_upload_rate:
+                return "upload rate %.0f KiB/s above %s KiB/s" % (upload_rate, self.max_upload_rate)
+            disk_queue = getattr(session_status, "disk_write_queue", 0)
+            if self.max_disk_queue > 0 and disk_queue > self.max_disk_queue:
+                return "disk write queue %d above %d" % (disk_queue, self.max_disk_queue)
+        return None
@@ -0,0 +1,113 @@
+#
+# scheduler.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+import heapq
+
+
+class DeadlineScheduler(object):
+    """Keeps the absolute stop deadline of every seeding torrent in a min-heap.
+
+    Rescheduling or cancelling a torrent does not touch the heap, stale heap
+    entries are skipped when they reach the top instead.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}  # torrent_id: deadline (unix time)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, torrent_id):
+        return torrent_id in self._deadlines
+
+    def __iter__(self):
+        return iter(self._deadlines)
+
+    def get(self, torrent_id, default=None):
+        return self._deadlines.get(torrent_id, default)
+
+    def schedule(self, torrent_id, deadline):
+        """Sets (or moves) the deadline for a torrent."""
+        if self._deadlines.get(torrent_id) == deadline:
+            return
+        self._deadlines[torrent_id] = deadline
+        heapq.heappush(self._heap, (deadline, torrent_id))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._rebuild()
+
+    def cancel(self, torrent_id):
+        """Forgets the deadline for a torrent, returns True if one was set."""
+        return self._deadlines.pop(torrent_id, None) is not None
+
+    def clear(self):
+        self._heap = []
+        self._deadlines.clear()
+
+    def next_deadline(self):
+        """Returns the earliest deadline or None if nothing is scheduled."""
+        self._discard_stale()
+        if self._heap:
+            return self._heap[0][0]
+        return None
+
+    def pop_expired(self, now):
+        """Removes and returns the ids of all torrents due at or before now."""
+        expired = []
+        heap = self._heap
+        while heap:
+            deadline, torrent_id = heap[0]
+            if self._deadlines.get(torrent_id) != deadline:
+                heapq.heappop(heap)
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(heap)
+            del self._deadlines[torrent_id]
+            expired.append(torrent_id)
+        return expired
+
+    def _discard_stale(self):
+        heap = self._heap
+        while heap and self._deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def _rebuild(self):
+        self._heap = [(deadline, torrent_id) for torrent_id, deadline in self._deadlines.iteritems()]
+        heapq.heapify(self._heap)
@@ -0,0 +1,147 @@
+#
+# snapshot.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+import binascii
+import os
+import struct
+import sys
+import zlib
+from array import array
+from deluge.log import LOG as log
+
+from persist import replace_file
+
+MAGIC = "STSN"
+VERSION = 1
+# magic, version, time written, number of torrents
+HEADER = struct.Struct("<4sHdI")
+ID_SIZE = 20  # torrent ids are stored as the binary info hash
+
+
+class Snapshot(object):
+    """The seeding times of the torrents with a stop time, as of written_at.
+
+    On disk the header is followed by the ids, then the seeding times and
+    the stop times as little-endian double columns and a CRC32 of it all,
+    so the whole file is read and checked in one go.
+    """
+
+    def __init__(self, written_at, torrent_ids, seeding_times, stop_times):
+        self.written_at = written_at
+        self.torrent_ids = torrent_ids
+        self.seeding_times = seeding_times  # array("d") in the order of torrent_ids
+        self.stop_times = stop_times
+
+    def __len__(self):
+        return len(self.torrent_ids)
+
+    def __iter__(self):
+        """Yields (torrent_id, seeding_time, stop_time)."""
+        for index, torrent_id in enumerate(self.torrent_ids):
+            yield torrent_id, self.seeding_times[index], self.stop_times[index]
+
+
+def _to_little_endian(column):
+    if sys.byteorder != "little":
+        column = array("d", column)
+        column.byteswap()
+    return column
+
+
+def write_snapshot(filename, written_at, rows):
+    """Writes the (torrent_id, seeding_time, stop_time) rows, returns the file size.
+
+    Rows whose id is not an info hash are left out.
+    """
+    ids = []
+    seeding_times = array("d")
+    stop_times = array("d")
+    for torrent_id, seeding_time, stop_time in rows:
+        try:
+            binary_id = binascii.unhexlify(torrent_id)
+        except (TypeError, ValueError):
+            continue
+        if len(binary_id) != ID_SIZE:
+            continue
+        ids.append(binary_id)
+        seeding_times.append(seeding_time)
+        stop_times.append(stop_time)
+    data = "".join([HEADER.pack(MAGIC, VERSION, written_at, len(ids)), "".join(ids),
+                    _to_little_endian(seeding_times).tostring(), _to_little_endian(stop_times).tostring()])
+    data += struct.pack("<I", zlib.crc32(data) & 0xffffffff)
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    replace_file(tmp_filename, filename)
+    return len(data)
+
+
+def read_snapshot(filename):
+    """Returns the Snapshot in filename, or None if it is missing or damaged."""
+    try:
+        with open(filename, "rb") as f:
+            data = f.read()
+    except IOError:
+        return None
+    if len(data) < HEADER.size + 4:
+        log.warning("seedtime ignoring truncated snapshot %s" % filename)
+        return None
+    magic, version, written_at, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        log.warning("seedtime ignoring snapshot %s of an unknown format" % filename)
+        return None
+    if len(data) != HEADER.size + count * (ID_SIZE + 16) + 4:
+        log.warning("seedtime ignoring truncated snapshot %s" % filename)
+        return None
+    if struct.unpack("<I", data[-4:])[0] != zlib.crc32(data[:-4]) & 0xffffffff:
+        log.warning("seedtime ignoring corrupt snapshot %s" % filename)
+        return None
+    offset = HEADER.size
+    torrent_ids = [binascii.hexlify(data[start:start + ID_SIZE])
+                   for start in xrange(offset, offset + count * ID_SIZE, ID_SIZE)]
+    offset += count * ID_SIZE
+    columns = []
+    for column_offset in (offset, offset + count * 8):
+        column = array("d")
+        column.fromstring(data[column_offset:column_offset + count * 8])
+        if sys.byteorder != "little":
+            column.byteswap()
+        columns.append(column)
+    return Snapshot(written_at, torrent_ids, columns[0], columns[1])
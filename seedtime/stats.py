@@ -0,0 +1,139 @@
+#
+# stats.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+import time
+
+# upper bounds (in ms) of the histogram buckets, the last bucket is unbounded
+BUCKET_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram(object):
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        ms = seconds * 1000
+        for index, bound in enumerate(BUCKET_BOUNDS):
+            if ms < bound:
+                break
+        else:
+            index = len(BUCKET_BOUNDS)
+        self.buckets[index] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": list(self.buckets),
+        }
+
+
+class Stats(object):
+    """Timing histograms and counters for the plugin's hot paths.
+
+    When disabled clock() returns None and every other call returns at once,
+    so the instrumentation costs one attribute check per measured call.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.since = time.time()
+        self.timings = {}
+        self.counters = {}
+        self.rule_hits = {}
+
+    def clock(self):
+        if self.enabled:
+            return time.time()
+        return None
+
+    def observe(self, name, started):
+        """Records the time since started, as returned by clock()."""
+        if started is None:
+            return
+        self.add(name, time.time() - started)
+
+    def add(self, name, seconds):
+        """Records a duration measured elsewhere, e.g. on a worker thread."""
+        if not self.enabled:
+            return
+        histogram = self.timings.get(name)
+        if histogram is None:
+            histogram = self.timings[name] = Histogram()
+        histogram.add(seconds)
+
+    def incr(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def rule_hit(self, index):
+        if self.enabled:
+            self.rule_hits[index] = self.rule_hits.get(index, 0) + 1
+
+    def to_dict(self):
+        return {
+            "enabled": self.enabled,
+            "since": self.since,
+            "bucket_bounds_ms": list(BUCKET_BOUNDS),
+            "timings": dict((name, histogram.to_dict()) for name, histogram in self.timings.iteritems()),
+            "counters": dict(self.counters),
+        }
+
+    def summary(self):
+        parts = []
+        for name, histogram in sorted(self.timings.iteritems()):
+            if histogram.count:
+                parts.append("%s: %d calls, mean %.1fms, max %.1fms" % (
+                    name, histogram.count, histogram.total / histogram.count * 1000, histogram.max * 1000))
+        parts.extend("%s: %d" % item for item in sorted(self.counters.iteritems()))
+        return ", ".join(parts)
@@ -0,0 +1,258 @@
+#
+# store.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+import bisect
+import os
+import sys
+import time
+from deluge.log import LOG as log
+
+from persist import replace_file
+
+COMPACT_MIN_LINES = 1000  # never compact journals shorter than this
+
+
+class StopTimeStore(object):
+    """The per-torrent stop times, kept in an append-only journal file.
+
+    Each line of the journal is "<torrent_id> <stop_time>", or
+    "<torrent_id> -" once the stop time is removed, later lines win. Changes
+    are buffered until flush() appends them, and the journal is rewritten
+    once it holds more than twice as many lines as there are stop times.
+    The file is only read the first time the stop times are accessed.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._stop_times = None
+        self._sorted_ids = None
+        self.pending = []
+        self.journal_lines = 0
+        self.needs_compact = False  # set when the journal may be missing or have broken lines
+
+    def _load(self):
+        stop_times = {}
+        lines = 0
+        try:
+            with open(self.filename, "rb") as f:
+                for line in f:
+                    lines += 1
+                    if not line.endswith("\n"):  # the tail of a write interrupted by a crash
+                        # appending would continue this line, rewrite the journal instead
+                        self.needs_compact = True
+                        continue
+                    torrent_id, _, value = line.strip().partition(" ")
+                    if value == "-":
+                        stop_times.pop(torrent_id, None)
+                        continue
+                    try:
+                        stop_times[torrent_id] = float(value)
+                    except ValueError:
+                        log.warning("seedtime ignoring invalid journal line %r" % line)
+                        self.needs_compact = True
+        except IOError:
+            pass
+        self.journal_lines = lines
+        self._stop_times = stop_times
+        return stop_times
+
+    @property
+    def loaded(self):
+        return self._stop_times is not None
+
+    def __len__(self):
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        return len(stop_times)
+
+    def __contains__(self, torrent_id):
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        return torrent_id in stop_times
+
+    def __iter__(self):
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        return iter(stop_times)
+
+    def __getitem__(self, torrent_id):
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        return stop_times[torrent_id]
+
+    def get(self, torrent_id, default=None):
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        return stop_times.get(torrent_id, default)
+
+    def iteritems(self):
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        return stop_times.iteritems()
+
+    def __setitem__(self, torrent_id, stop_time):
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        stop_time = float(stop_time)
+        if stop_times.get(torrent_id) != stop_time:
+            if torrent_id not in stop_times:
+                self._sorted_ids = None
+            stop_times[torrent_id] = stop_time
+            self.pending.append("%s %r\n" % (torrent_id, stop_time))
+
+    def __delitem__(self, torrent_id):
+        if self.pop(torrent_id, None) is None:
+            raise KeyError(torrent_id)
+
+    def pop(self, torrent_id, default=None):
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        if torrent_id not in stop_times:
+            return default
+        self.pending.append("%s -\n" % torrent_id)
+        self._sorted_ids = None
+        return stop_times.pop(torrent_id)
+
+    def query(self, prefix="", offset=0, limit=None, after=None):
+        """Returns (total, page) for the torrent ids starting with prefix.
+
+        total is the number of matching ids, page the (torrent_id, stop_time)
+        pairs of the matches from offset on, ordered by torrent id. With after
+        the page starts past that torrent id, whether it still exists or not.
+        """
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        if self._sorted_ids is None:
+            self._sorted_ids = sorted(stop_times)
+        ids = self._sorted_ids
+        start = bisect.bisect_left(ids, prefix)
+        end = bisect.bisect_left(ids, prefix + "\xff") if prefix else len(ids)
+        if after is not None:
+            start_after = bisect.bisect_right(ids, after, start, end)
+        else:
+            start_after = start
+        first = start_after + offset
+        last = end if limit is None else min(end, first + limit)
+        return end - start, [(torrent_id, stop_times[torrent_id]) for torrent_id in ids[first:last]]
+
+    def update(self, stop_times):
+        for torrent_id, stop_time in stop_times.iteritems():
+            self[torrent_id] = stop_time
+
+    def flush(self):
+        """Appends the buffered changes to the journal, compacting it if needed."""
+        write = self.prepare_flush()
+        if write is not None:
+            write()
+
+    def compact(self):
+        """Rewrites the journal with one line per stop time."""
+        self.prepare_compact()()
+
+    def prepare_flush(self):
+        """Takes the buffered changes, returns a function writing them or None.
+
+        The function only touches the file, so it may run on another thread,
+        but the writes have to run in the order they were prepared.
+        """
+        if self.needs_compact:
+            return self.prepare_compact()
+        if not self.pending:
+            return None
+        if self.journal_lines + len(self.pending) > max(COMPACT_MIN_LINES, 2 * len(self._stop_times)):
+            return self.prepare_compact()
+        pending, self.pending = self.pending, []
+        self.journal_lines += len(pending)
+        return lambda: self._write(self._append, pending)
+
+    def prepare_compact(self):
+        stop_times = self._stop_times
+        if stop_times is None:
+            stop_times = self._load()
+        items = stop_times.items()
+        self.pending = []
+        self.journal_lines = len(items)
+        self.needs_compact = False
+        return lambda: self._write(self._rewrite, items)
+
+    def _write(self, write, data):
+        try:
+            write(data)
+        except:
+            self.needs_compact = True
+            raise
+
+    def _append(self, lines):
+        with open(self.filename, "ab") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self, items):
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, "wb") as f:
+            f.writelines("%s %r\n" % item for item in items)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_file(tmp_filename, self.filename)
+
+
+def run_writes(writes):
+    """Calls the functions from prepare_flush in order, returns the seconds taken."""
+    started = time.time()
+    error = None
+    for write in writes:
+        try:
+            write()
+        except (IOError, OSError):
+            # the other journals are still written, the failed one is compacted next time
+            if error is None:
+                error = sys.exc_info()
+    if error is not None:
+        raise error[0], error[1], error[2]
+    return time.time() - started
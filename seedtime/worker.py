@@ -0,0 +1,104 @@
+#
+# worker.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+from twisted.internet import reactor
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+
+class Worker(object):
+    """A bounded thread pool for work that would otherwise block the reactor.
+
+    Functions handed to run() must not touch deluge objects or plugin state,
+    only their results are applied back on the reactor. With size 0, while
+    the pool is stopped, or once max_pending calls are waiting, a call runs
+    at once on the calling thread instead. That caller-runs back-pressure
+    keeps the queue bounded and slows down whoever is flooding it.
+    """
+
+    def __init__(self, size, max_pending):
+        self.size = size
+        self.max_pending = max_pending
+        self.pool = ThreadPool(0, max(1, size), "seedtime")
+        self.running = False
+        self.pending = 0
+        self.queued = 0
+        self.ran_inline = 0
+        self.max_pending_seen = 0
+
+    def start(self):
+        if not self.running:
+            self.pool.start()
+            self.running = True
+
+    def stop(self):
+        """Stops the pool, waiting for the calls already queued to finish."""
+        if self.running:
+            self.running = False
+            self.pool.stop()
+
+    def resize(self, size):
+        self.size = size
+        if size > 0:
+            self.pool.adjustPoolsize(0, size)
+
+    def run(self, func, *args, **kwargs):
+        """Calls func(*args, **kwargs) on the pool, returns a Deferred of its result."""
+        if self.size <= 0 or not self.running or self.pending >= self.max_pending:
+            self.ran_inline += 1
+            return maybeDeferred(func, *args, **kwargs)
+        self.pending += 1
+        self.queued += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        d = deferToThreadPool(reactor, self.pool, func, *args, **kwargs)
+        d.addBoth(self._done)
+        return d
+
+    def _done(self, result):
+        self.pending -= 1
+        return result
+
+    def get_counters(self):
+        return {
+            "size": self.size,
+            "pending": self.pending,
+            "queued": self.queued,
+            "ran_inline": self.ran_inline,
+            "max_pending_seen": self.max_pending_seen,
+        }
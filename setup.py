@@ -69,5 +69,7 @@ setup(
     %s = %s:GtkUIPlugin
     [deluge.plugin.web]
     %s = %s:WebUIPlugin
-    """ % ((__plugin_name__, __plugin_name__.lower())*3)
+    [console_scripts]
+    seedtime-fleet = %s.fleet:main
+    """ % ((__plugin_name__, __plugin_name__.lower())*3 + (__plugin_name__.lower(),))
 )
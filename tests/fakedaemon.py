@@ -0,0 +1,155 @@
+#
+# fakedaemon.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+"""A stand-in for deluge daemons running the seedtime plugin.
+
+FakeDaemonSSLProxy replaces deluge.ui.client.DaemonSSLProxy and talks to
+FakeDaemon objects registered by host and port instead of the network.
+"""
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, fail, succeed
+
+
+class BadLoginError(Exception):
+    pass
+
+
+class FakeDaemon(object):
+    """The RPC endpoint of one daemon, with the seedtime methods the fleet uses.
+
+    hang makes connecting never finish, ignored_keys are left out by
+    set_config as a daemon running an older plugin would.
+    """
+
+    def __init__(self, host, port, username="", password="", hang=False, ignored_keys=()):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.hang = hang
+        self.ignored_keys = set(ignored_keys)
+        self.config = {"default_stop_time": 7, "filter_list": []}
+        self.stop_times = {}
+        self.connects = 0
+        self.logins = 0
+        self.calls = []
+
+    def set_config(self, config):
+        for key, value in config.iteritems():
+            if key not in self.ignored_keys:
+                self.config[key] = value
+
+    def get_config(self):
+        return dict(self.config)
+
+    def get_stats(self):
+        return {"scheduled": len(self.stop_times), "waiting_for_condition": 0, "enforcement_queue": 0,
+                "enforced": 0, "pending_removals": 0}
+
+    def get_stop_times(self, offset=0, limit=100, prefix="", after=None):
+        return {"total": len(self.stop_times), "offset": offset, "stop_times": {}, "last": None, "version": 1}
+
+
+class FakeDaemonSSLProxy(object):
+    """Answers like DaemonSSLProxy, always after a reactor turn."""
+
+    daemons = {}  # (host, port): FakeDaemon
+
+    @classmethod
+    def register(cls, daemon):
+        cls.daemons[(daemon.host, daemon.port)] = daemon
+
+    @classmethod
+    def reset(cls):
+        cls.daemons = {}
+
+    def __init__(self):
+        self.daemon = None
+        self.connected = False
+        self.logged_in = False
+        self.disconnect_callback = None
+
+    def set_disconnect_callback(self, callback):
+        self.disconnect_callback = callback
+
+    def later(self, func, *args):
+        d = Deferred()
+        def answer():
+            try:
+                d.callback(func(*args))
+            except Exception, e:
+                d.errback(e)
+        reactor.callLater(0, answer)
+        return d
+
+    def connect(self, host, port):
+        daemon = self.daemons.get((host, port))
+        if daemon is None:
+            return fail(IOError("Connection refused"))
+        daemon.connects += 1
+        self.daemon = daemon
+        if daemon.hang:
+            return Deferred()
+        def connected():
+            self.connected = True
+            return "ok"
+        return self.later(connected)
+
+    def authenticate(self, username, password):
+        def login():
+            if (username, password) != (self.daemon.username, self.daemon.password):
+                raise BadLoginError("Password does not match")
+            self.daemon.logins += 1
+            self.logged_in = True
+            return 10
+        return self.later(login)
+
+    def call(self, method, *args, **kwargs):
+        if not self.logged_in:
+            return fail(IOError("Not logged in"))
+        self.daemon.calls.append(method)
+        func = getattr(self.daemon, method.split(".", 1)[1])
+        return self.later(lambda: func(*args, **kwargs))
+
+    def disconnect(self):
+        was_connected, self.connected, self.logged_in = self.connected, False, False
+        if was_connected and self.disconnect_callback is not None:
+            self.disconnect_callback()
+        return succeed(None)
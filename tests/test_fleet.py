@@ -0,0 +1,131 @@
+#
+# test_fleet.py
+#
+# Copyright (C) 2009 Chase Sterling <chase.sterling@gmail.com>
+#
+# Basic plugin template created by:
+# Copyright (C) 2008 Martijn Voncken <mvoncken@gmail.com>
+# Copyright (C) 2007-2009 Andrew Resch <andrewresch@gmail.com>
+# Copyright (C) 2009 Damien Churchill <damoxc@gmail.com>
+#
+# Deluge is free software.
+#
+# You may redistribute it and/or modify it under the terms of the
+# GNU General Public License, as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option)
+# any later version.
+#
+# deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with deluge.    If not, write to:
+# 	The Free Software Foundation, Inc.,
+# 	51 Franklin Street, Fifth Floor
+# 	Boston, MA  02110-1301, USA.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+from twisted.internet.defer import DeferredList
+from twisted.trial import unittest
+
+from seedtime import fleet
+from tests.fakedaemon import FakeDaemon, FakeDaemonSSLProxy
+
+
+class FleetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        FakeDaemonSSLProxy.reset()
+        self.patch(fleet, "DaemonSSLProxy", FakeDaemonSSLProxy)
+
+    def make_fleet(self, *daemons, **kwargs):
+        for daemon in daemons:
+            FakeDaemonSSLProxy.register(daemon)
+        f = fleet.Fleet([fleet.Daemon(daemon.host, daemon.port, "user", "secret") for daemon in daemons],
+                        **kwargs)
+        self.addCleanup(f.disconnect)
+        return f
+
+    def test_parse_host(self):
+        self.assertEqual(fleet.parse_host("user:pw@seedbox:1234"), ("seedbox", 1234, "user", "pw"))
+        self.assertEqual(fleet.parse_host("seedbox"), ("seedbox", fleet.DEFAULT_PORT, "", ""))
+        self.assertRaises(ValueError, fleet.parse_host, "seedbox:port")
+
+    def test_connection_reused(self):
+        daemon = FakeDaemon("a", 1, "user", "secret")
+        f = self.make_fleet(daemon)
+        d = f.get_stats()
+        d.addCallback(lambda results: f.get_summaries())
+        def check(results):
+            self.assertEqual(results["a:1"][0], True)
+            self.assertEqual((daemon.connects, daemon.logins), (1, 1))
+            self.assertEqual(len(daemon.calls), 3)
+        return d.addCallback(check)
+
+    def test_concurrent_calls_share_the_connection(self):
+        daemon = FakeDaemon("a", 1, "user", "secret")
+        f = self.make_fleet(daemon)
+        d = DeferredList([f.get_stats(), f.get_summaries()], fireOnOneErrback=True)
+        def check(results):
+            self.assertEqual([result["a:1"][0] for success, result in results], [True, True])
+            self.assertEqual((daemon.connects, daemon.logins), (1, 1))
+        return d.addCallback(check)
+
+    def test_timeout(self):
+        slow = FakeDaemon("slow", 1, "user", "secret", hang=True)
+        fast = FakeDaemon("fast", 1, "user", "secret")
+        f = self.make_fleet(slow, fast, timeout=0.1)
+        def check(results):
+            self.assertEqual(results["fast:1"][0], True)
+            success, error = results["slow:1"]
+            self.assertEqual(success, False)
+            self.assertEqual(error, "CancelledError")
+            # the stuck connection is given up, the next call starts a new one
+            self.assertEqual(f.daemons[0].pending, None)
+        return f.get_stats().addCallback(check)
+
+    def test_login_failure(self):
+        daemon = FakeDaemon("a", 1, "user", "other")
+        f = self.make_fleet(daemon)
+        def check(results):
+            self.assertEqual(results["a:1"], (False, "Password does not match"))
+            self.assertEqual(daemon.calls, [])
+        return f.get_stats().addCallback(check)
+
+    def test_push_config(self):
+        daemon = FakeDaemon("a", 1, "user", "secret")
+        f = self.make_fleet(daemon)
+        config = {"default_stop_time": 3, "filter_list": [{"field": "tracker", "filter": "foo", "stop_time": 1}]}
+        def check(results):
+            self.assertEqual(results["a:1"], (True, "ok"))
+            self.assertEqual(daemon.config["default_stop_time"], 3)
+            self.assertEqual(daemon.calls, ["seedtime.set_config", "seedtime.get_config"])
+        return f.push_config(config).addCallback(check)
+
+    def test_push_config_read_back_mismatch(self):
+        old = FakeDaemon("old", 1, "user", "secret", ignored_keys=["default_stop_time"])
+        new = FakeDaemon("new", 1, "user", "secret")
+        f = self.make_fleet(old, new)
+        def check(results):
+            self.assertEqual(results["old:1"], (False, "config not applied: default_stop_time"))
+            self.assertEqual(results["new:1"], (True, "ok"))
+        return f.push_config({"default_stop_time": 3}).addCallback(check)
+
+    def test_validate_config(self):
+        fleet.validate_config({"filter_list": [{"field": "tracker", "filter": "foo", "stop_time": 1}]})
+        self.assertRaises(ValueError, fleet.validate_config, [])
+        self.assertRaises(ValueError, fleet.validate_config,
+                          {"filter_list": [{"field": "tracker", "filter": "(", "stop_time": 1}]})
+        self.assertRaises(ValueError, fleet.validate_config, {"default_min_ratio": -1})